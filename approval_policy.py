@@ -0,0 +1,135 @@
+import fnmatch
+import json
+import logging
+import threading
+from datetime import datetime
+
+
+class ApprovalPolicy:
+
+    decisions = {'allow', 'deny', 'ask'}
+
+    def __init__(self, rules: list = None, default: str = 'ask', dry_run: bool = False,
+                 audit_log: str = 'approval_audit.jsonl'):
+
+        self.rules = rules or []
+        self.default = default
+        self.dry_run = dry_run
+        self.audit_log = audit_log
+        self.logger = logging.getLogger(__name__)
+        self._session_allowlist = {}
+        self._lock = threading.Lock()
+
+        for number, rule in enumerate(self.rules, start=1):
+            if rule.get('decision') not in self.decisions:
+                raise ValueError(f'Approval rule {number}: decision must be one of {sorted(self.decisions)}')
+
+        if self.default not in self.decisions:
+            raise ValueError(f'Default decision must be one of {sorted(self.decisions)}')
+
+    @classmethod
+    def from_file(cls, path: str) -> 'ApprovalPolicy':
+
+        with open(path, 'r') as f:
+            config = json.load(f)
+
+        return cls(
+            rules=config.get('rules', []),
+            default=config.get('default', 'ask'),
+            dry_run=config.get('dry_run', False),
+            audit_log=config.get('audit_log', 'approval_audit.jsonl'),
+        )
+
+    @staticmethod
+    def _matches(patterns, values: list, require_all: bool = True) -> bool:
+
+        if patterns in (None, '*'):
+            return True
+
+        check = all if require_all else any
+
+        return check(any(fnmatch.fnmatchcase(value, pattern) for pattern in patterns) for value in values)
+
+    def _rule_applies(self, rule: dict, operation: str, paths: list, size) -> bool:
+
+        if not self._matches(rule.get('operations'), [operation]):
+            return False
+
+        # A deny rule covers an operation that touches any of its paths (e.g. copying out of a denied tree);
+        # allow and ask rules only cover operations whose paths all match.
+        if not self._matches(rule.get('paths'), paths, require_all=rule['decision'] != 'deny'):
+            return False
+
+        if 'max_bytes' in rule:
+            resolved_size = size() if callable(size) else size
+
+            if resolved_size is None or resolved_size > rule['max_bytes']:
+                return False
+
+        return True
+
+    def decide(self, session_id: str, operation: str, paths: list, size=None) -> tuple:
+
+        with self._lock:
+            allowlist = self._session_allowlist.get(session_id, set())
+
+            if all((operation, path) in allowlist for path in paths):
+                return 'allow', 'session allowlist'
+
+        for number, rule in enumerate(self.rules, start=1):
+            if self._rule_applies(rule, operation, paths, size):
+                return rule['decision'], rule.get('name', f'rule {number}')
+
+        return self.default, 'default'
+
+    def allow_for_session(self, session_id: str, operation: str, paths: list) -> None:
+
+        with self._lock:
+            allowlist = self._session_allowlist.setdefault(session_id, set())
+            allowlist.update((operation, path) for path in paths)
+
+    def clear_session(self, session_id: str) -> None:
+
+        with self._lock:
+            self._session_allowlist.pop(session_id, None)
+
+    def audit(self, session_id: str, operation: str, paths: list, decision: str, reason: str, approved: bool) -> None:
+
+        entry = {
+            'timestamp': datetime.utcnow().isoformat(),
+            'session_id': session_id,
+            'operation': operation,
+            'paths': paths,
+            'decision': decision,
+            'reason': reason,
+            'approved': approved,
+            'dry_run': self.dry_run,
+        }
+
+        self.logger.debug('Approval decision: %s', entry)
+
+        if not self.audit_log:
+            return
+
+        try:
+            with self._lock, open(self.audit_log, 'a') as f:
+                f.write(json.dumps(entry) + '\n')
+
+        except OSError as e:
+            self.logger.warning('Could not write approval audit log: %s', e)
+
+
+_policies = {}
+_policies_lock = threading.Lock()
+
+
+def get_approval_policy(path: str) -> ApprovalPolicy:
+
+    # One policy per file and process: every session shares it, and session allowlists are keyed by session id.
+    with _policies_lock:
+        policy = _policies.get(path)
+
+        if policy is None:
+            policy = _policies[path] = ApprovalPolicy.from_file(path)
+
+        return policy
@@ -0,0 +1,290 @@
+import argparse
+import builtins
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+from main import AgenticGemini
+
+
+MODE_METHODS = {
+    '1': 'run_basic_code_agent',
+    '2': 'run_coder_reviewer_chat',
+    '3': 'run_group_chat_auto',
+    '4': 'run_human_in_the_loop_chat',
+    '5': 'run_tool_use_chat',
+    '6': 'run_parallel_fanout_chat',
+}
+
+
+class ScriptedIO:
+
+    def __init__(self):
+
+        self.original_stdout = sys.stdout
+        self.original_input = builtins.input
+        self.original_thread_start = threading.Thread.start
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def start_intercept(self) -> None:
+
+        sys.stdout = self
+        builtins.input = self.input
+        # AG2's run() and the fan-out pool start their own threads; those inherit the task binding of the thread that started them.
+        threading.Thread.start = lambda thread: self._start_bound_thread(thread)
+
+    def stop_intercept(self) -> None:
+
+        sys.stdout = self.original_stdout
+        builtins.input = self.original_input
+        threading.Thread.start = self.original_thread_start
+
+    def _start_bound_thread(self, thread) -> None:
+
+        binding = self._binding()
+
+        if binding is not None:
+            run = thread.run
+
+            def bound_run():
+
+                self._local.binding = binding
+                run()
+
+            thread.run = bound_run
+
+        self.original_thread_start(thread)
+
+    def bind(self, replies: list, default_reply: str) -> None:
+
+        self._local.binding = {
+            'replies': deque(replies),
+            'default_reply': default_reply,
+            'transcript': [],
+            'input_requests': 0,
+        }
+
+    def unbind(self) -> tuple:
+
+        binding = self._local.binding
+        self._local.binding = None
+
+        with self._lock:
+            return ''.join(binding['transcript']), binding['input_requests']
+
+    def _binding(self):
+
+        return getattr(self._local, 'binding', None)
+
+    def write(self, text: str) -> None:
+
+        binding = self._binding()
+
+        if binding is not None:
+            binding['transcript'].append(text)
+        else:
+            self.original_stdout.write(text)
+
+    def flush(self) -> None:
+
+        if self._binding() is None:
+            self.original_stdout.flush()
+
+    def input(self, prompt: str = '') -> str:
+
+        binding = self._binding()
+
+        if binding is None:
+            return self.original_input(prompt)
+
+        with self._lock:
+            binding['input_requests'] += 1
+            reply = binding['replies'].popleft() if binding['replies'] else binding['default_reply']
+            binding['transcript'].append(f'{prompt}{reply}\n')
+
+        return reply
+
+
+class BatchRunner:
+
+    def __init__(self, config_path: str, max_calls: int, concurrency: int, approval_policy_path: str = None,
+                 history_token_budget: int = 6000, speaker_selection: str = 'auto', max_parallel_workers: int = 4,
+                 max_subtasks: int = 8, session_workspaces: bool = False, workspace_on_exit: str = 'ask', model_client: dict = None,
+                 enabled_tools: list = None):
+
+        self.config_path = config_path
+        self.max_calls = max_calls
+        self.approval_policy_path = approval_policy_path
+        self.history_token_budget = history_token_budget
+        self.speaker_selection = speaker_selection
+        self.max_parallel_workers = max_parallel_workers
+        self.max_subtasks = max_subtasks
+        self.session_workspaces = session_workspaces
+        self.workspace_on_exit = workspace_on_exit
+        self.model_client = model_client
+        self.enabled_tools = enabled_tools
+        self.concurrency = concurrency
+        self.scripted_io = ScriptedIO()
+        self.logger = logging.getLogger(__name__)
+        self._write_lock = threading.Lock()
+
+    @staticmethod
+    def load_tasks(tasks_path: str) -> list:
+
+        tasks = []
+
+        with open(tasks_path, 'r') as f:
+            for line_number, line in enumerate(f, start=1):
+                if not line.strip():
+                    continue
+
+                task = json.loads(line)
+                task.setdefault('id', str(line_number))
+                task['id'] = str(task['id'])
+                task['mode'] = str(task.get('mode', ''))
+
+                if task['mode'] not in MODE_METHODS:
+                    raise ValueError(f'Task {task["id"]}: unknown mode {task["mode"]!r}. Supported: {sorted(MODE_METHODS)}')
+
+                if 'prompt' not in task:
+                    raise ValueError(f'Task {task["id"]}: missing "prompt".')
+
+                tasks.append(task)
+
+        return tasks
+
+    @staticmethod
+    def load_checkpoint(results_path: str, retry_failed: bool) -> set:
+
+        done = set()
+
+        if not os.path.exists(results_path):
+            return done
+
+        with open(results_path, 'r') as f:
+            for line in f:
+                try:
+                    result = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+
+                if result.get('status') == 'ok' or not retry_failed:
+                    done.add(str(result.get('id')))
+
+        return done
+
+    def run_task(self, task: dict) -> dict:
+
+        started_at = datetime.utcnow().isoformat()
+        wall_start = time.perf_counter()
+        cpu_start = time.thread_time()
+        replies = [task['prompt']] + list(task.get('replies', []))
+        result = {'id': task['id'], 'mode': task['mode'], 'started_at': started_at}
+
+        self.scripted_io.bind(replies, task.get('default_reply', ''))
+
+        try:
+            gemini = AgenticGemini(
+                config_path=self.config_path,
+                max_calls=task.get('max_calls', self.max_calls),
+                session_id=f'batch-{task["id"]}',
+                approval_policy_path=self.approval_policy_path,
+                history_token_budget=self.history_token_budget,
+                speaker_selection=task.get('speaker_selection', self.speaker_selection),
+                max_parallel_workers=self.max_parallel_workers,
+                max_subtasks=self.max_subtasks,
+                session_workspaces=self.session_workspaces,
+                workspace_on_exit=task.get('workspace_on_exit', self.workspace_on_exit),
+                model_client=self.model_client,
+                enabled_tools=task.get('enabled_tools', self.enabled_tools),
+            )
+            result['output'] = getattr(gemini, MODE_METHODS[task['mode']])()
+            result['status'] = 'ok'
+
+        except Exception as e:
+            result['status'] = 'error'
+            result['error'] = f'{type(e).__name__}: {str(e)}'
+
+        finally:
+            transcript, input_requests = self.scripted_io.unbind()
+
+        result['wall_seconds'] = round(time.perf_counter() - wall_start, 3)
+        result['cpu_seconds'] = round(time.thread_time() - cpu_start, 3)
+        result['input_requests'] = input_requests
+        result['transcript'] = transcript
+
+        return result
+
+    def _append_result(self, results_path: str, result: dict) -> None:
+
+        with self._write_lock, open(results_path, 'a') as f:
+            f.write(json.dumps(result, default=str) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+
+    def run(self, tasks_path: str, results_path: str, retry_failed: bool = False) -> dict:
+
+        tasks = self.load_tasks(tasks_path)
+        done = self.load_checkpoint(results_path, retry_failed)
+        pending = [task for task in tasks if task['id'] not in done]
+        counts = {'ok': 0, 'error': 0, 'skipped': len(tasks) - len(pending)}
+        batch_start = time.perf_counter()
+
+        self.logger.info('Running %d tasks (%d already done) with concurrency %d', len(pending), counts['skipped'], self.concurrency)
+        self.scripted_io.start_intercept()
+
+        try:
+            with ThreadPoolExecutor(max_workers=max(1, self.concurrency)) as executor:
+                futures = {executor.submit(self.run_task, task): task for task in pending}
+
+                for future in as_completed(futures):
+                    result = future.result()
+                    self._append_result(results_path, result)
+                    counts[result['status']] += 1
+                    self.logger.info('Task %s finished: %s in %.1fs', result['id'], result['status'], result['wall_seconds'])
+
+        finally:
+            self.scripted_io.stop_intercept()
+
+        counts['wall_seconds'] = round(time.perf_counter() - batch_start, 3)
+
+        return counts
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Run Agentic Gemini tasks from a JSONL file without user interaction.')
+    parser.add_argument('tasks', help='JSONL file with one task per line: {"id", "mode", "prompt", "replies", "default_reply"}')
+    parser.add_argument('results', help='JSONL file to append results to; also used as the resume checkpoint')
+    parser.add_argument('--concurrency', type=int, default=4, help='Maximum number of tasks running at once')
+    parser.add_argument('--max-calls', type=int, default=10, help='Default max turns/rounds per task')
+    parser.add_argument('--config', default='config_path.json', help='Path to config_path.json')
+    parser.add_argument('--retry-failed', action='store_true', help='Re-run tasks whose previous result was an error')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+
+    with open(args.config, 'r') as f:
+        app_config = json.load(f)
+
+    runner = BatchRunner(
+        config_path=app_config['config_path'],
+        max_calls=args.max_calls,
+        concurrency=args.concurrency,
+        approval_policy_path=app_config.get('approval_policy_path'),
+        history_token_budget=app_config.get('history_token_budget', 6000),
+        speaker_selection=app_config.get('speaker_selection', 'auto'),
+        max_parallel_workers=app_config.get('max_parallel_workers', 4),
+        max_subtasks=app_config.get('max_subtasks', 8),
+        session_workspaces=app_config.get('session_workspaces', False),
+        workspace_on_exit=app_config.get('workspace_on_exit', 'ask'),
+        model_client=app_config.get('model_client'),
+        enabled_tools=app_config.get('enabled_tools'),
+    )
+    summary = runner.run(args.tasks, args.results, retry_failed=args.retry_failed)
+    print(json.dumps(summary))
@@ -0,0 +1,125 @@
+import json
+import logging
+import threading
+
+
+VERSION = 1
+
+
+def _jsonable(value):
+
+    # Tool calls and responses are plain dicts; anything exotic is stored as its string form.
+    return json.loads(json.dumps(value, default=str))
+
+
+class SessionRecorder:
+
+    def __init__(self, session_id: str, save=None, state: dict = None):
+
+        self.session_id = session_id
+        self.save_handler = save
+        self.resumed = bool(state)
+        self.state = state or {
+            'version': VERSION,
+            'prompt': None,
+            'messages': [],
+            'speaker': None,
+            'clipboard': None,
+            'extra': {},
+        }
+        self.clipboard_source = None
+        self.logger = logging.getLogger(__name__)
+        self._lock = threading.Lock()
+
+    def save(self) -> None:
+
+        if self.save_handler is None:
+            return
+
+        with self._lock:
+            if self.clipboard_source is not None:
+                self.state['clipboard'] = _jsonable(self.clipboard_source())
+
+            try:
+                self.save_handler(self.session_id, self.state)
+            except Exception as e:
+                # A failed checkpoint must never take the running session down with it.
+                self.logger.warning('Could not save checkpoint for %s: %s', self.session_id, e)
+
+    def ask_prompt(self, text: str) -> str:
+
+        if self.state['prompt'] is None:
+            self.state['prompt'] = input(text)
+            self.save()
+
+        return self.state['prompt']
+
+    def set_extra(self, key: str, value) -> None:
+
+        self.state['extra'][key] = _jsonable(value)
+        self.save()
+
+    def track(self, agents: list) -> None:
+
+        for agent in agents:
+            agent.register_hook('process_message_before_send', self._record)
+
+    def _record(self, sender, message, recipient, silent):
+
+        groupchat = getattr(recipient, 'groupchat', None)
+
+        if groupchat is not None:
+            # Group chats resume from the manager's own transcript, which already carries every speaker's name.
+            entry = dict(message) if isinstance(message, dict) else {'content': message}
+            entry.setdefault('role', 'user')
+            entry['name'] = sender.name
+            self.state['messages'] = _jsonable(list(groupchat.messages) + [entry])
+        else:
+            self.state['messages'].append(_jsonable({'sender': sender.name, 'recipient': recipient.name, 'message': message}))
+
+        self.state['speaker'] = sender.name
+        self.save()
+
+        return message
+
+    def restore_pair(self, initiator, recipient, max_turns: int = None) -> tuple:
+
+        # Returns the first message and turn budget for initiator.initiate_chat(..., clear_history=False).
+        records = list(self.state['messages'])
+        agents = {initiator.name: initiator, recipient.name: recipient}
+
+        if records and records[-1]['sender'] == initiator.name:
+            # The reply to this message was still in flight; send it again instead of replaying the history.
+            message = records.pop()['message']
+        else:
+            def message(sender, receiver, context):
+
+                return sender.generate_reply(messages=sender.chat_messages[receiver], sender=receiver)
+
+        for record in records:
+            sender, receiver = agents[record['sender']], agents[record['recipient']]
+            sender._append_oai_message(record['message'], receiver, role='assistant', name=sender.name)
+            receiver._append_oai_message(record['message'], sender, role='user', name=sender.name)
+
+        self.state['messages'] = records
+
+        if max_turns is not None:
+            used = sum(1 for record in records if record['sender'] == initiator.name)
+            max_turns = max(1, max_turns - used)
+
+        return message, max_turns
+
+    def restore_group(self, max_rounds: int) -> tuple:
+
+        # AG2 resumes a group chat itself when given the transcript as a list of messages.
+        messages = [dict(message) for message in self.state['messages']]
+
+        for message in messages:
+            # The opening message comes from AG2's temporary user agent, which does not exist on resume.
+            if message.get('name') == '_User':
+                del message['name']
+
+        if len(messages) > 1:
+            return messages, max(1, max_rounds - (len(messages) - 1))
+
+        return self.state['prompt'], max_rounds
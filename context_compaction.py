@@ -0,0 +1,193 @@
+import hashlib
+import re
+from typing import Any
+from autogen.agentchat.contrib.capabilities.transform_messages import TransformMessages
+from autogen.agentchat.group.patterns import AutoPattern, RoundRobinPattern
+
+
+CHARS_PER_TOKEN = 4
+CODE_BLOCK = re.compile(r'```')
+PLAN_STEP = re.compile(r'^\s*(?:\d+[.)]|[-*]|step\s+\d+)\s+', re.IGNORECASE | re.MULTILINE)
+
+
+def estimate_tokens(messages: list) -> int:
+
+    # A rough chars/4 estimate is enough to keep the prompt under budget without a tokenizer round trip.
+    return sum(len(_text(message)) for message in messages) // CHARS_PER_TOKEN
+
+
+def _text(message: dict) -> str:
+
+    content = message.get('content')
+
+    if isinstance(content, str):
+        return content
+
+    if isinstance(content, list):
+        return ' '.join(part.get('text', '') for part in content if isinstance(part, dict))
+
+    return ''
+
+
+class HistoryCompactor:
+
+    def __init__(self, max_tokens: int = 6000, keep_recent: int = 4, plan_agents: tuple = ('planner_agent',),
+                 summary_chars: int = 240):
+
+        self.max_tokens = max_tokens
+        self.keep_recent = keep_recent
+        self.plan_agents = set(plan_agents)
+        self.summary_chars = summary_chars
+        self._summaries = {}
+
+    def _is_plan(self, message: dict) -> bool:
+
+        if message.get('name') in self.plan_agents:
+            return True
+
+        return len(PLAN_STEP.findall(_text(message))) >= 3
+
+    @staticmethod
+    def _has_code(message: dict) -> bool:
+
+        return len(CODE_BLOCK.findall(_text(message))) >= 2
+
+    def _summarize(self, message: dict) -> str:
+
+        text = _text(message)
+        key = hashlib.sha1(f'{message.get("name")}\0{text}'.encode('utf-8', errors='replace')).hexdigest()
+        summary = self._summaries.get(key)
+
+        if summary is None:
+            # Code is dropped from summaries; the latest code block is kept verbatim elsewhere.
+            prose = ' '.join(CODE_BLOCK.split(text)[::2]).split()
+            summary = ' '.join(prose)
+
+            if len(summary) > self.summary_chars:
+                summary = summary[:self.summary_chars].rsplit(' ', 1)[0] + ' ...'
+
+            summary = f'- {message.get("name") or message.get("role", "unknown")}: {summary or "(no text)"}'
+            self._summaries[key] = summary
+
+        return summary
+
+    def _split_point(self, messages: list) -> int:
+
+        split = max(0, len(messages) - self.keep_recent)
+
+        # Never start the verbatim tail with a tool response whose tool call was summarized away.
+        while split > 0 and messages[split].get('role') == 'tool':
+            split -= 1
+
+        return split
+
+    def apply_transform(self, messages: list[dict[str, Any]]) -> list[dict[str, Any]]:
+
+        if estimate_tokens(messages) <= self.max_tokens:
+            return messages
+
+        split = self._split_point(messages)
+        older, recent = messages[:split], messages[split:]
+
+        if not older:
+            return messages
+
+        pinned = set()
+        latest_plan = next((i for i in range(len(older) - 1, -1, -1) if self._is_plan(older[i])), None)
+        latest_code = next((i for i in range(len(older) - 1, -1, -1) if self._has_code(older[i])), None)
+
+        for index in (latest_plan, latest_code):
+            if index is not None:
+                pinned.add(index)
+
+        # The first message is the task itself, keep it verbatim so the goal never gets lost.
+        pinned.add(0)
+
+        summary_lines = [self._summarize(message) for i, message in enumerate(older)
+                         if i not in pinned and message.get('role') != 'tool' and not message.get('tool_calls')]
+        kept = [older[i] for i in sorted(pinned)]
+
+        budget = self.max_tokens - estimate_tokens(kept + recent)
+
+        # Drop the oldest summary lines until the digest fits in whatever budget is left.
+        omitted = 0
+
+        while summary_lines and sum(len(line) + 1 for line in summary_lines) // CHARS_PER_TOKEN > budget:
+            summary_lines.pop(0)
+            omitted += 1
+
+        compacted = [kept[0]]
+
+        if summary_lines:
+            header = 'Summary of earlier messages'
+            header += f' ({omitted} older ones omitted):' if omitted else ':'
+            compacted.append({
+                'role': 'user',
+                'name': 'history_summary',
+                'content': header + '\n' + '\n'.join(summary_lines),
+            })
+
+        return compacted + kept[1:] + recent
+
+    def get_logs(self, pre_transform_messages: list[dict[str, Any]], post_transform_messages: list[dict[str, Any]]) -> tuple[str, bool]:
+
+        before = estimate_tokens(pre_transform_messages)
+        after = estimate_tokens(post_transform_messages)
+
+        if after < before:
+            return f'Compacted history from ~{before} to ~{after} tokens ({len(pre_transform_messages)} -> {len(post_transform_messages)} messages).', True
+
+        return 'History within token budget; nothing compacted.', False
+
+
+class CompactingAutoPattern(AutoPattern):
+
+    def __init__(self, *args, compactor: HistoryCompactor = None, **kwargs):
+
+        super().__init__(*args, **kwargs)
+        self.compactor = compactor
+
+    def prepare_group_chat(self, max_rounds: int, messages):
+
+        prepared = super().prepare_group_chat(max_rounds=max_rounds, messages=messages)
+        groupchat = prepared[7]
+
+        if self.compactor is not None:
+            # GroupChat reads this in __post_init__, so it has to be set on the private attribute as well.
+            transforms = TransformMessages(transforms=[self.compactor], verbose=False)
+            groupchat.select_speaker_transform_messages = transforms
+            groupchat._speaker_selection_transforms = transforms
+
+        return prepared
+
+
+def attach_compactor(agents: list, compactor: HistoryCompactor) -> None:
+
+    transforms = TransformMessages(transforms=[compactor], verbose=False)
+
+    for agent in agents:
+        transforms.add_to_agent(agent)
+
+
+def build_pattern(agents: list, initial_agent, speaker_selection: str, llm_config, compactor: HistoryCompactor = None,
+                  user_agent=None):
+
+    if speaker_selection == 'round_robin':
+        # Fixed hand-offs: no group_manager LLM call per round at all.
+        return RoundRobinPattern(
+            initial_agent=initial_agent,
+            agents=agents,
+            user_agent=user_agent,
+            group_manager_args={'name': 'group_manager'},
+        )
+
+    if speaker_selection != 'auto':
+        raise ValueError(f'Unknown speaker_selection {speaker_selection!r}. Use "auto" or "round_robin".')
+
+    return CompactingAutoPattern(
+        agents=agents,
+        initial_agent=initial_agent,
+        user_agent=user_agent,
+        group_manager_args={'name': 'group_manager', 'llm_config': llm_config},
+        compactor=compactor,
+    )
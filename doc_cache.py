@@ -0,0 +1,307 @@
+import hashlib
+import json
+import logging
+import mmap
+import os
+import queue
+import struct
+import tempfile
+import threading
+import zlib
+from workspace import BASE_DIR
+
+
+CACHE_DIRNAME = '.agentic_cache'
+MAGIC = b'AGSC'
+VERSION = 1
+PREFIX = struct.Struct('<4sBI')
+CONVERTIBLE_EXTENSIONS = {'.pdf', '.docx', '.ipynb'}
+
+
+def _flatten_outline(outline) -> list:
+
+    flat = []
+
+    for item in outline:
+        if isinstance(item, list):
+            flat.extend(_flatten_outline(item))
+        else:
+            flat.append(item)
+
+    return flat
+
+
+def convert_pdf(path: str) -> tuple:
+
+    import pypdf
+
+    reader = pypdf.PdfReader(path)
+    units = [page.extract_text() or '' for page in reader.pages]
+    outline = []
+
+    try:
+        for node in _flatten_outline(reader.outline):
+            try:
+                outline.append((node.title, reader.get_destination_page_number(node)))
+            except Exception:
+                continue
+    except Exception:
+        pass
+
+    return units, outline
+
+
+def convert_docx(path: str) -> tuple:
+
+    import docx
+
+    return [p.text for p in docx.Document(path).paragraphs], []
+
+
+def convert_ipynb(path: str) -> tuple:
+
+    with open(path, 'r', encoding='utf-8') as f:
+        raw = json.load(f)
+
+    units = []
+
+    for cell in raw.get('cells', []):
+        source = cell.get('source', '')
+        source = ''.join(source) if isinstance(source, list) else source
+
+        if cell.get('cell_type') in ('code', 'markdown'):
+            units.append(f'# --- CELL: {cell["cell_type"].upper()} ---\n{source}')
+
+    return units, []
+
+
+CONVERTERS = {'.pdf': convert_pdf, '.docx': convert_docx, '.ipynb': convert_ipynb}
+
+
+class Sidecar:
+
+    # Layout: MAGIC, version, header length, JSON header (unit offsets, outline, source stat), unit bodies.
+    def __init__(self, path: str):
+
+        self.path = path
+
+        with open(path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, header_length = PREFIX.unpack_from(self._mmap, 0)
+
+        if magic != MAGIC or version != VERSION:
+            self.close()
+            raise ValueError(f'Not a sidecar file: {path}')
+
+        header = json.loads(self._mmap[PREFIX.size:PREFIX.size + header_length])
+        self._body_start = PREFIX.size + header_length
+        self.units = header['units']
+        self.outline = header['outline']
+        self.compressed = header['compressed']
+        self.source_stat = tuple(header['source_stat'])
+
+    def __len__(self) -> int:
+
+        return len(self.units)
+
+    def unit(self, index: int) -> str:
+
+        offset, length = self.units[index]
+        data = self._mmap[self._body_start + offset:self._body_start + offset + length]
+
+        if self.compressed:
+            data = zlib.decompress(data)
+
+        return data.decode('utf-8')
+
+    def texts(self, start: int = 0, end: int = None, char_limit: int = None):
+
+        # Yields units lazily so a caller with a character budget stops touching the file once it is full.
+        total = 0
+
+        for index in range(start, len(self) if end is None else min(end, len(self))):
+            text = self.unit(index)
+            yield index, text
+            total += len(text)
+
+            if char_limit is not None and total > char_limit:
+                return
+
+    def close(self) -> None:
+
+        self._mmap.close()
+
+
+class DocumentCache:
+
+    def __init__(self, base_dir: str = BASE_DIR, cache_dir: str = None, compress: bool = True):
+
+        self.base_dir = base_dir
+        self.cache_dir = cache_dir or os.path.join(base_dir, CACHE_DIRNAME)
+        self.compress = compress
+        self.logger = logging.getLogger(__name__)
+        self._queue = queue.Queue()
+        self._locks = {}
+        self._locks_guard = threading.Lock()
+        self._worker = None
+
+    def sidecar_path(self, logical_path: str) -> str:
+
+        digest = hashlib.sha1(os.path.normpath(logical_path).encode('utf-8', errors='replace')).hexdigest()
+
+        return os.path.join(self.cache_dir, digest[:2], f'{digest}.sidecar')
+
+    @staticmethod
+    def _source_stat(absolute_path: str) -> tuple:
+
+        stat = os.stat(absolute_path)
+
+        return stat.st_size, stat.st_mtime_ns
+
+    def _lock_for(self, sidecar_path: str) -> threading.Lock:
+
+        with self._locks_guard:
+            return self._locks.setdefault(sidecar_path, threading.Lock())
+
+    def get(self, absolute_path: str, logical_path: str = None):
+
+        sidecar_path = self.sidecar_path(logical_path or absolute_path)
+
+        try:
+            sidecar = Sidecar(sidecar_path)
+        except (OSError, ValueError):
+            return None
+
+        if sidecar.source_stat != self._source_stat(absolute_path):
+            sidecar.close()
+            return None
+
+        return sidecar
+
+    def build(self, absolute_path: str, logical_path: str = None) -> Sidecar:
+
+        ext = os.path.splitext(absolute_path)[1].lower()
+        sidecar_path = self.sidecar_path(logical_path or absolute_path)
+
+        with self._lock_for(sidecar_path):
+            # Another thread may have finished the same conversion while this one waited.
+            sidecar = self.get(absolute_path, logical_path)
+
+            if sidecar is not None:
+                return sidecar
+
+            source_stat = self._source_stat(absolute_path)
+            units, outline = CONVERTERS[ext](absolute_path)
+            blobs = []
+            offsets = []
+            position = 0
+
+            for text in units:
+                data = text.encode('utf-8')
+
+                if self.compress:
+                    data = zlib.compress(data, 6)
+
+                offsets.append((position, len(data)))
+                blobs.append(data)
+                position += len(data)
+
+            header = json.dumps({
+                'units': offsets,
+                'outline': outline,
+                'compressed': self.compress,
+                'source_stat': source_stat,
+            }).encode('utf-8')
+
+            os.makedirs(os.path.dirname(sidecar_path), exist_ok=True)
+            fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(sidecar_path), prefix='.tmp-')
+
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    f.write(PREFIX.pack(MAGIC, VERSION, len(header)))
+                    f.write(header)
+
+                    for data in blobs:
+                        f.write(data)
+
+                os.replace(temp_path, sidecar_path)
+
+            except BaseException:
+                if os.path.exists(temp_path):
+                    os.remove(temp_path)
+                raise
+
+        return Sidecar(sidecar_path)
+
+    def get_or_build(self, absolute_path: str, logical_path: str = None) -> Sidecar:
+
+        return self.get(absolute_path, logical_path) or self.build(absolute_path, logical_path)
+
+    def schedule(self, absolute_path: str, logical_path: str = None) -> None:
+
+        # Files or whole directories the tools just wrote. Only the background worker drains the queue;
+        # without it (no --convert-documents) the next read converts the file instead.
+        if self._worker is None:
+            return
+
+        self._queue.put((absolute_path, logical_path))
+
+    def start_background(self, scan: bool = True) -> None:
+
+        if self._worker is not None:
+            return
+
+        self._worker = threading.Thread(target=self._run_background, args=(scan,), daemon=True)
+        self._worker.start()
+
+    def _run_background(self, scan: bool) -> None:
+
+        if scan:
+            for root, dirs, files in os.walk(self.base_dir):
+                dirs[:] = [d for d in dirs if not d.startswith('.')]
+
+                for name in files:
+                    self._convert(os.path.join(root, name))
+
+        while True:
+            absolute_path, logical_path = self._queue.get()
+
+            if not os.path.isdir(absolute_path):
+                self._convert(absolute_path, logical_path)
+                continue
+
+            for root, dirs, files in os.walk(absolute_path):
+                dirs[:] = [d for d in dirs if not d.startswith('.')]
+
+                for name in files:
+                    path = os.path.join(root, name)
+                    self._convert(path, os.path.join(logical_path, os.path.relpath(path, absolute_path)) if logical_path else None)
+
+    def _convert(self, absolute_path: str, logical_path: str = None) -> None:
+
+        name = os.path.basename(absolute_path)
+
+        if name.startswith('.') or os.path.splitext(name)[1].lower() not in CONVERTIBLE_EXTENSIONS:
+            return
+
+        try:
+            sidecar = self.get_or_build(absolute_path, logical_path)
+            sidecar.close()
+        except Exception as e:
+            self.logger.debug('Could not convert %s: %s', absolute_path, e)
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_document_cache(**kwargs) -> DocumentCache:
+
+    global _cache
+
+    with _cache_lock:
+        if _cache is None:
+            _cache = DocumentCache(**kwargs)
+
+        return _cache
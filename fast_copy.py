@@ -0,0 +1,297 @@
+import errno
+import os
+import shutil
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+
+FICLONE = 0x40049409
+CHUNK_SIZE = 64 * 1024 * 1024
+PARTIAL_SUFFIX = '.partial'
+
+
+class CopyProgress:
+
+    def __init__(self, files_total: int, bytes_total: int, callback=None, interval: float = 1.0):
+
+        self.files_total = files_total
+        self.bytes_total = bytes_total
+        self.files_done = 0
+        self.files_skipped = 0
+        self.bytes_done = 0
+        self.callback = callback
+        self.interval = interval
+        self._last_report = time.monotonic()
+        self._lock = threading.Lock()
+
+    def advance(self, nbytes: int = 0, files: int = 0, skipped: int = 0) -> None:
+
+        with self._lock:
+            self.bytes_done += nbytes
+            self.files_done += files
+            self.files_skipped += skipped
+            now = time.monotonic()
+
+            if self.callback and now - self._last_report >= self.interval:
+                self._last_report = now
+                self.callback(self)
+
+    def summary(self) -> str:
+
+        percent = 100.0 * self.bytes_done / self.bytes_total if self.bytes_total else 100.0
+
+        return (f'{self.files_done}/{self.files_total} files, '
+                f'{self.bytes_done / 1048576:.1f}/{self.bytes_total / 1048576:.1f} MiB ({percent:.0f}%)')
+
+
+def _partial_path(dst: str, src_stat) -> str:
+
+    # The source's size and mtime are part of the name, so a partial file is only ever resumed from the same source version.
+    directory, name = os.path.split(dst)
+
+    return os.path.join(directory, f'.{name}.{src_stat.st_size}-{src_stat.st_mtime_ns}{PARTIAL_SUFFIX}')
+
+
+def _find_partials(directory: str) -> list:
+
+    try:
+        return [entry for entry in os.listdir(directory or '.') if entry.startswith('.') and entry.endswith(PARTIAL_SUFFIX)]
+    except FileNotFoundError:
+        return []
+
+
+def _remove_stale_partials(dst: str, keep: str, partials: list) -> None:
+
+    directory, name = os.path.split(dst)
+    prefix = f'.{name}.'
+
+    for entry in partials:
+        path = os.path.join(directory, entry)
+
+        if entry.startswith(prefix) and path != keep:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+def _is_up_to_date(src_stat, dst: str) -> bool:
+
+    try:
+        dst_stat = os.stat(dst)
+    except FileNotFoundError:
+        return False
+
+    return dst_stat.st_size == src_stat.st_size and abs(dst_stat.st_mtime - src_stat.st_mtime) < 1e-3
+
+
+def _try_reflink(src_fd: int, dst_fd: int) -> bool:
+
+    if fcntl is None:
+        return False
+
+    try:
+        fcntl.ioctl(dst_fd, FICLONE, src_fd)
+        return True
+    except OSError:
+        return False
+
+
+def _copy_range(src_fd: int, dst_fd: int, offset: int, size: int, progress: CopyProgress) -> None:
+
+    # Kernel-side copies first (copy_file_range can also reflink on btrfs/xfs/NFS), then sendfile,
+    # then a plain userspace loop for filesystems that support neither.
+    strategies = []
+
+    if hasattr(os, 'copy_file_range'):
+        strategies.append(lambda count, position: os.copy_file_range(src_fd, dst_fd, count, position, position))
+
+    if hasattr(os, 'sendfile'):
+        strategies.append(lambda count, position: _sendfile_at(src_fd, dst_fd, count, position))
+
+    strategies.append(lambda count, position: _userspace_copy(src_fd, dst_fd, count, position))
+
+    for strategy in strategies:
+        try:
+            while offset < size:
+                copied = strategy(min(CHUNK_SIZE, size - offset), offset)
+
+                if copied == 0:
+                    break
+
+                offset += copied
+                progress.advance(copied)
+
+            return
+
+        except OSError as e:
+            if e.errno not in (errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP, errno.ENOTSUP, errno.EBADF):
+                raise
+
+
+def _sendfile_at(src_fd: int, dst_fd: int, count: int, position: int) -> int:
+
+    os.lseek(dst_fd, position, os.SEEK_SET)
+
+    return os.sendfile(dst_fd, src_fd, position, count)
+
+
+def _userspace_copy(src_fd: int, dst_fd: int, count: int, position: int) -> int:
+
+    data = os.pread(src_fd, min(count, 1024 * 1024), position)
+
+    if data:
+        os.pwrite(dst_fd, data, position)
+
+    return len(data)
+
+
+def copy_file(src: str, dst: str, progress: CopyProgress, partials: list = None) -> None:
+
+    # `partials` lists the partial files already in dst's directory; tree copies list each directory once and pass it in.
+    src_stat = os.stat(src)
+
+    if _is_up_to_date(src_stat, dst):
+        progress.advance(src_stat.st_size, files=1, skipped=1)
+        return
+
+    partial = _partial_path(dst, src_stat)
+    offset = 0
+    _remove_stale_partials(dst, partial, _find_partials(os.path.dirname(dst)) if partials is None else partials)
+
+    if os.path.exists(partial):
+        offset = min(os.path.getsize(partial), src_stat.st_size)
+
+    with open(src, 'rb') as src_file, open(partial, 'r+b' if offset else 'wb') as dst_file:
+        src_fd, dst_fd = src_file.fileno(), dst_file.fileno()
+
+        if offset:
+            # Resume an interrupted copy from where the partial file ends.
+            os.ftruncate(dst_fd, offset)
+            progress.advance(offset)
+            _copy_range(src_fd, dst_fd, offset, src_stat.st_size, progress)
+        elif src_stat.st_size and _try_reflink(src_fd, dst_fd):
+            progress.advance(src_stat.st_size)
+        else:
+            _copy_range(src_fd, dst_fd, 0, src_stat.st_size, progress)
+
+    shutil.copystat(src, partial)
+    os.replace(partial, dst)
+    progress.advance(files=1)
+
+
+def _plan_tree(src: str, dst: str) -> tuple:
+
+    directories = [dst]
+    files = []
+    links = []
+
+    # Symlinks are recreated as symlinks, never followed: a link can point outside the tree or back into it.
+    for root, dirs, names in os.walk(src):
+        relative_root = os.path.relpath(root, src)
+        target_root = os.path.normpath(os.path.join(dst, relative_root))
+
+        for d in dirs:
+            if os.path.islink(os.path.join(root, d)):
+                links.append((os.path.join(root, d), os.path.join(target_root, d)))
+            else:
+                directories.append(os.path.join(target_root, d))
+
+        for name in names:
+            if name.startswith('.') and name.endswith(PARTIAL_SUFFIX):
+                continue
+
+            source_path = os.path.join(root, name)
+
+            if os.path.islink(source_path):
+                links.append((source_path, os.path.join(target_root, name)))
+            else:
+                files.append((source_path, os.path.join(target_root, name), os.path.getsize(source_path)))
+
+    return directories, files, links
+
+
+def _copy_link(src: str, dst: str) -> None:
+
+    if os.path.lexists(dst):
+        if not os.path.islink(dst) and os.path.isdir(dst):
+            shutil.rmtree(dst)
+        else:
+            os.remove(dst)
+
+    os.symlink(os.readlink(src), dst)
+
+
+def copy_tree(src: str, dst: str, workers: int = 8, progress_callback=None) -> CopyProgress:
+
+    directories, files, links = _plan_tree(src, dst)
+    progress = CopyProgress(len(files), sum(size for _, _, size in files), progress_callback)
+
+    partials = {}
+
+    for directory in directories:
+        os.makedirs(directory, exist_ok=True)
+        partials[os.path.normpath(directory)] = _find_partials(directory)
+
+    # Largest files first so a single huge file does not end up as the long tail.
+    files.sort(key=lambda item: item[2], reverse=True)
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        futures = [executor.submit(copy_file, source_path, target_path, progress, partials[os.path.normpath(os.path.dirname(target_path))])
+                   for source_path, target_path, _ in files]
+
+        for future in futures:
+            future.result()
+
+    for source_path, target_path in links:
+        _copy_link(source_path, target_path)
+
+    for root, dirs, _ in os.walk(src):
+        target_root = os.path.normpath(os.path.join(dst, os.path.relpath(root, src)))
+        shutil.copystat(root, target_root)
+
+    return progress
+
+
+def copy_path(src: str, dst: str, workers: int = 8, progress_callback=None) -> CopyProgress:
+
+    if os.path.isdir(src):
+        return copy_tree(src, dst, workers, progress_callback)
+
+    if os.path.isdir(dst):
+        dst = os.path.join(dst, os.path.basename(src))
+
+    progress = CopyProgress(1, os.path.getsize(src), progress_callback)
+    copy_file(src, dst, progress)
+
+    return progress
+
+
+def move_path(src: str, dst: str, workers: int = 8, progress_callback=None) -> CopyProgress:
+
+    if os.path.isdir(dst):
+        dst = os.path.join(dst, os.path.basename(src))
+
+    try:
+        os.rename(src, dst)
+        return CopyProgress(0, 0)
+
+    except OSError as e:
+        if e.errno != errno.EXDEV:
+            raise
+
+    # Different filesystem: copy (resumable), then remove the source once everything landed.
+    progress = copy_path(src, dst, workers, progress_callback)
+
+    if os.path.isdir(src):
+        shutil.rmtree(src)
+    else:
+        os.remove(src)
+
+    return progress
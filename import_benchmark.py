@@ -0,0 +1,80 @@
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+from datetime import datetime
+
+
+IMPORTTIME_LINE = re.compile(r'^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)')
+
+
+def measure(module: str) -> dict:
+
+    # A fresh interpreter per run, so nothing is already sitting in sys.modules.
+    completed = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        capture_output=True,
+        text=True,
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+    )
+
+    if completed.returncode != 0:
+        raise RuntimeError(f'Importing {module} failed:\n{completed.stderr[-2000:]}')
+
+    cumulative = {}
+
+    for line in completed.stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+
+        if match:
+            cumulative[match.group(4)] = int(match.group(2))
+
+    return {'total_us': cumulative.get(module, 0), 'cumulative_us': cumulative}
+
+
+def run(modules: list, repeat: int, top: int) -> dict:
+
+    results = {}
+
+    for module in modules:
+        runs = [measure(module) for _ in range(repeat)]
+        totals = [r['total_us'] for r in runs]
+        slowest = sorted(runs[-1]['cumulative_us'].items(), key=lambda item: item[1], reverse=True)
+
+        results[module] = {
+            'median_ms': round(statistics.median(totals) / 1000, 1),
+            'min_ms': round(min(totals) / 1000, 1),
+            'max_ms': round(max(totals) / 1000, 1),
+            'slowest_imports': [(name, round(us / 1000, 1)) for name, us in slowest if name != module][:top],
+        }
+
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Measure cold import time of the application modules.')
+    parser.add_argument('modules', nargs='*', default=['main', 'web_app'], help='Modules to import (default: main web_app)')
+    parser.add_argument('--repeat', type=int, default=5, help='Fresh interpreters per module; the median is reported')
+    parser.add_argument('--top', type=int, default=8, help='Number of slowest nested imports to list')
+    parser.add_argument('--record', help='Append the results to this JSONL file to track startup time over time')
+    parser.add_argument('--max-ms', type=float, help='Exit with status 1 if any module\'s median exceeds this many milliseconds')
+    args = parser.parse_args()
+
+    results = run(args.modules, args.repeat, args.top)
+
+    for module, result in results.items():
+        print(f'{module}: median {result["median_ms"]} ms (min {result["min_ms"]}, max {result["max_ms"]}, {args.repeat} runs)')
+
+        for name, ms in result['slowest_imports']:
+            print(f'    {ms:>9.1f} ms  {name}')
+
+    if args.record:
+        with open(args.record, 'a') as f:
+            f.write(json.dumps({'timestamp': datetime.utcnow().isoformat(), 'results': results}) + '\n')
+
+    if args.max_ms is not None and any(result['median_ms'] > args.max_ms for result in results.values()):
+        print(f'Import time budget of {args.max_ms} ms exceeded.')
+        sys.exit(1)
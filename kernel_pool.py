@@ -0,0 +1,343 @@
+import atexit
+import json
+import logging
+import os
+import select
+import signal
+import subprocess
+import sys
+import threading
+import time
+
+KERNEL_SOURCE = r'''
+import json
+import os
+import signal
+import sys
+import tempfile
+import traceback
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+
+class CPULimitExceeded(Exception):
+    pass
+
+
+def _on_cpu_limit(signum, frame):
+    raise CPULimitExceeded('CPU time limit exceeded for this execution.')
+
+
+executing = False
+
+
+def _on_interrupt(signum, frame):
+    # Only running code is interrupted; a SIGINT that arrives between requests must not end the protocol loop.
+    if executing:
+        raise KeyboardInterrupt
+
+
+signal.signal(signal.SIGINT, _on_interrupt)
+
+if resource is not None:
+    signal.signal(signal.SIGXCPU, _on_cpu_limit)
+    memory_limit = int(sys.argv[2]) * 1024 * 1024
+
+    if memory_limit:
+        resource.setrlimit(resource.RLIMIT_AS, (memory_limit, memory_limit))
+
+for module_name in json.loads(sys.argv[1]):
+    try:
+        __import__(module_name)
+    except Exception:
+        pass
+
+protocol_out = os.fdopen(os.dup(1), 'w')
+protocol_in = sys.stdin
+sys.stdin = open(os.devnull, 'r')
+namespace = {'__name__': '__main__'}
+
+for request_line in protocol_in:
+    request = json.loads(request_line)
+    capture = tempfile.TemporaryFile(mode='w+b')
+    saved_fds = (os.dup(1), os.dup(2))
+    error = None
+
+    sys.stdout.flush()
+    sys.stderr.flush()
+    os.dup2(capture.fileno(), 1)
+    os.dup2(capture.fileno(), 2)
+
+    try:
+        if resource is not None and request.get('cpu_seconds'):
+            usage = resource.getrusage(resource.RUSAGE_SELF)
+            used = int(usage.ru_utime + usage.ru_stime)
+            hard = resource.getrlimit(resource.RLIMIT_CPU)[1]
+            soft = used + int(request['cpu_seconds'])
+            if hard != resource.RLIM_INFINITY:
+                soft = min(soft, hard)
+            resource.setrlimit(resource.RLIMIT_CPU, (soft, hard))
+
+        try:
+            executing = True
+            exec(compile(request['code'], request.get('filename', '<agent>'), 'exec'), namespace)
+        finally:
+            executing = False
+
+    except BaseException as e:
+        if isinstance(e, SystemExit) and not e.code:
+            error = None
+        else:
+            error = ''.join(traceback.format_exception(type(e), e, e.__traceback__.tb_next or e.__traceback__))
+
+    finally:
+        if resource is not None:
+            hard = resource.getrlimit(resource.RLIMIT_CPU)[1]
+            resource.setrlimit(resource.RLIMIT_CPU, (hard, hard))
+        sys.stdout.flush()
+        sys.stderr.flush()
+        os.dup2(saved_fds[0], 1)
+        os.dup2(saved_fds[1], 2)
+        os.close(saved_fds[0])
+        os.close(saved_fds[1])
+
+    capture.seek(0)
+    output = capture.read().decode('utf-8', errors='replace')
+    capture.close()
+
+    protocol_out.write(json.dumps({'output': output, 'error': error}) + '\n')
+    protocol_out.flush()
+'''
+
+
+class Kernel:
+
+    def __init__(self, cwd: str, memory_limit_mb: int, prewarm_imports: list):
+
+        self.cwd = cwd
+        self.memory_limit_mb = memory_limit_mb
+        self.last_used = time.monotonic()
+        self.lock = threading.Lock()
+        self.process = subprocess.Popen(
+            # The kernel applies its own memory limit on startup; preexec_fn is not safe once the server runs threads.
+            [sys.executable, '-u', '-c', KERNEL_SOURCE, json.dumps(prewarm_imports), str(memory_limit_mb or 0)],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            cwd=cwd,
+            text=True,
+            start_new_session=True,
+        )
+
+    def is_alive(self) -> bool:
+
+        return self.process.poll() is None
+
+    def execute(self, code: str, timeout: float, cpu_seconds: int, filename: str = '<agent>') -> dict:
+
+        with self.lock:
+            self.last_used = time.monotonic()
+
+            if not self.is_alive():
+
+                return {'output': '', 'error': 'Kernel is not running.', 'restarted': True}
+
+            request = {'code': code, 'cpu_seconds': cpu_seconds, 'filename': filename}
+            self.process.stdin.write(json.dumps(request) + '\n')
+            self.process.stdin.flush()
+
+            response = self._read_response(timeout)
+
+            if response is None and self.is_alive():
+                # Interrupt the running code first so the namespace survives a long-running cell.
+                os.kill(self.process.pid, signal.SIGINT)
+                response = self._read_response(5)
+
+                if response is not None:
+                    response['error'] = f'Execution timed out after {timeout} seconds and was interrupted.\n{response.get("error") or ""}'
+
+            self.last_used = time.monotonic()
+
+            if response is None:
+                self.shutdown()
+
+                return {'output': '', 'error': 'Kernel died or did not respond (memory/CPU limit or timeout). Its state was lost.', 'restarted': True}
+
+            return response
+
+    def _read_response(self, timeout: float):
+
+        ready, _, _ = select.select([self.process.stdout], [], [], timeout)
+
+        if not ready:
+            return None
+
+        line = self.process.stdout.readline()
+
+        if not line:
+            return None
+
+        return json.loads(line)
+
+    def shutdown(self) -> None:
+
+        if self.is_alive():
+            self.process.kill()
+
+        self.process.wait()
+
+        for stream in (self.process.stdin, self.process.stdout):
+            try:
+                stream.close()
+            except Exception:
+                pass
+
+
+class KernelPool:
+
+    def __init__(self, cwd: str = '/my_files', warm_kernels: int = 1, idle_timeout: float = 900.0,
+                 memory_limit_mb: int = 2048, cpu_seconds: int = 300, prewarm_imports: list = None):
+
+        self.cwd = cwd
+        self.warm_kernels = warm_kernels
+        self.idle_timeout = idle_timeout
+        self.memory_limit_mb = memory_limit_mb
+        self.cpu_seconds = cpu_seconds
+        self.prewarm_imports = prewarm_imports if prewarm_imports is not None else ['numpy', 'pandas']
+        self.logger = logging.getLogger(__name__)
+
+        self._sessions = {}
+        self._spares = []
+        self._lock = threading.Lock()
+        self._closed = False
+
+        self._fill_spares_async()
+
+        reaper = threading.Thread(target=self._reap_idle, daemon=True)
+        reaper.start()
+
+    def _start_kernel(self) -> Kernel:
+
+        return Kernel(self.cwd, self.memory_limit_mb, self.prewarm_imports)
+
+    def _fill_spares_async(self) -> None:
+
+        threading.Thread(target=self._fill_spares, daemon=True).start()
+
+    def _fill_spares(self) -> None:
+
+        while True:
+            with self._lock:
+                self._spares = [kernel for kernel in self._spares if kernel.is_alive()]
+
+                if self._closed or len(self._spares) >= self.warm_kernels:
+                    return
+
+            kernel = self._start_kernel()
+
+            with self._lock:
+                if self._closed:
+                    kernel.shutdown()
+                    return
+
+                self._spares.append(kernel)
+
+    def acquire(self, session_id: str, cwd: str = None) -> Kernel:
+
+        with self._lock:
+            kernel = self._sessions.get(session_id)
+
+            if kernel and kernel.is_alive():
+                return kernel
+
+            while self._spares:
+                kernel = self._spares.pop()
+                if kernel.is_alive():
+                    break
+            else:
+                kernel = None
+
+        if kernel is None:
+            kernel = self._start_kernel()
+
+        if cwd and cwd != self.cwd:
+            # Spares are started in the pool directory; move this one into the session's own workspace.
+            kernel.execute(f'__import__("os").chdir({cwd!r})', 30, self.cpu_seconds)
+
+        with self._lock:
+            self._sessions[session_id] = kernel
+
+        self._fill_spares_async()
+
+        return kernel
+
+    def execute(self, session_id: str, code: str, timeout: float = 120.0, filename: str = '<agent>', cwd: str = None) -> dict:
+
+        kernel = self.acquire(session_id, cwd)
+        result = kernel.execute(code, timeout, self.cpu_seconds, filename)
+
+        if result.get('restarted'):
+            with self._lock:
+                if self._sessions.get(session_id) is kernel:
+                    del self._sessions[session_id]
+
+        return result
+
+    def release(self, session_id: str) -> None:
+
+        with self._lock:
+            kernel = self._sessions.pop(session_id, None)
+
+        if kernel:
+            kernel.shutdown()
+
+    def _reap_idle(self) -> None:
+
+        while not self._closed:
+            time.sleep(min(self.idle_timeout, 30))
+            now = time.monotonic()
+
+            with self._lock:
+                idle = [session_id for session_id, kernel in self._sessions.items()
+                        if not kernel.lock.locked() and now - kernel.last_used > self.idle_timeout]
+
+            for session_id in idle:
+                self.logger.info('Evicting idle kernel for session %s', session_id)
+                self.release(session_id)
+
+    def shutdown(self) -> None:
+
+        with self._lock:
+            self._closed = True
+            kernels = list(self._sessions.values()) + self._spares
+            self._sessions.clear()
+            self._spares = []
+
+        for kernel in kernels:
+            kernel.shutdown()
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_kernel_pool(**kwargs) -> KernelPool:
+
+    global _pool
+
+    with _pool_lock:
+        if _pool is None:
+            _pool = KernelPool(**kwargs)
+            atexit.register(_pool.shutdown)
+
+        return _pool
+
+
+def existing_kernel_pool():
+
+    # For cleanup paths: returns None rather than starting a pool (and its warm kernels) just to release nothing.
+    with _pool_lock:
+        return _pool
@@ -1,42 +1,113 @@
+import copy
 import logging
+import importlib
 import json
 import os
 import shutil
 import re
-import nbformat
-import pypdf
-from nbformat.v4 import new_notebook, new_code_cell, new_markdown_cell
+import sys
+import difflib
+import tempfile
+import threading
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from typing import Annotated
-from autogen import (
-    AssistantAgent,
-    UserProxyAgent,
-    LLMConfig,
-    ConversableAgent,
-    register_function,
-)
-from autogen.agentchat import run_group_chat
-from autogen.agentchat.group.patterns import AutoPattern
+from profiling import RunProfiler, phase
+from kernel_pool import existing_kernel_pool, get_kernel_pool
+import fast_copy
+from approval_policy import ApprovalPolicy, get_approval_policy
+from checkpoint import SessionRecorder
+from workspace import BASE_DIR, get_workspace_manager
+from doc_cache import CONVERTIBLE_EXTENSIONS, get_document_cache
+from tool_registry import get_tool_registry
+import table_query
+
+# nbformat, pypdf, python-docx and the autogen stack are imported where they are first needed,
+# so opening the Web UI or running one mode does not pay for every other mode's dependencies.
+HEAVY_MODULES = ('autogen', 'autogen.oai.gemini', 'context_compaction', 'nbformat', 'pypdf')
+
+# Reading the umask means setting it; doing that once at import keeps it from racing with file creation in other threads.
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
+
+def prewarm_imports(modules: tuple = HEAVY_MODULES) -> None:
+
+    logger = logging.getLogger(__name__)
+
+    for module_name in modules:
+        try:
+            with phase('prewarm_import'):
+                importlib.import_module(module_name)
+        except Exception as e:
+            logger.warning('Prewarm of %s failed: %s', module_name, e)
 
 
 class AgenticGemini:
 
-    _clipboard_src = None
-    _clipboard_op = None
+    _notebook_cache = OrderedDict()
+    _notebook_cache_lock = threading.Lock()
+    _notebook_cache_size = 8
+    _session = threading.local()
+    _registry_lock = threading.Lock()
+    checkpoint_handler = None
+    approval_policy = ApprovalPolicy()
 
-    def __init__(self, config_path: str, max_calls: int):
+    def __init__(self, config_path: str, max_calls: int, session_id: str = None, approval_policy_path: str = None,
+                 history_token_budget: int = 6000, speaker_selection: str = 'auto', max_parallel_workers: int = 4,
+                 max_subtasks: int = 8, session_workspaces: bool = False, workspace_on_exit: str = 'ask', model_client: dict = None,
+                 enabled_tools: list = None, resume_state: dict = None, progress_handler=None):
 
         self.config_path = config_path
         self.max_calls = max_calls
-        self.llm_config = LLMConfig.from_json(path=self.config_path)
+        self.session_id = session_id or str(uuid.uuid4())
+        self.history_token_budget = history_token_budget
+        self.speaker_selection = speaker_selection
+        self.max_parallel_workers = max_parallel_workers
+        self.max_subtasks = max_subtasks
+        self.session_workspaces = session_workspaces
+        self.workspace_on_exit = workspace_on_exit
+        self.enabled_tools = enabled_tools
+        self.progress_handler = progress_handler
+        # Conversation state is checkpointed after every message, so a restarted process can pick the session up again.
+        self.recorder = SessionRecorder(self.session_id, save=AgenticGemini.checkpoint_handler, state=resume_state)
+        self._runs = 0
+
+        if approval_policy_path:
+            AgenticGemini.approval_policy = get_approval_policy(approval_policy_path)
+
+        with phase('llm_config_load'):
+            from autogen import LLMConfig
+
+            self.llm_config = LLMConfig.from_json(path=self.config_path)
+
+        with phase('model_client_install'):
+            from model_client import install_model_client
+
+            self.model_client = install_model_client(**(model_client or {}))
 
         logging.basicConfig(level=logging.INFO)
         self.logger = logging.getLogger(__name__)
 
+    def _begin_run(self) -> None:
+
+        # The CLI reuses one instance for every menu choice; only the first run continues the given checkpoint,
+        # each later one is a new session with its own prompt, plan and transcript.
+        if self._runs:
+            self.session_id = str(uuid.uuid4())
+            self.recorder = SessionRecorder(self.session_id, save=AgenticGemini.checkpoint_handler)
+
+        self._runs += 1
+
     def run_basic_code_agent(self):
 
+        from autogen import AssistantAgent, UserProxyAgent
+
         self.logger.info('Running: Basic Code Agent')
 
-        prompt = input('Enter your prompt for the assistant: ')
+        self._begin_run()
+        prompt = self.recorder.ask_prompt('Enter your prompt for the assistant: ')
 
         assistant = AssistantAgent('assistant', llm_config=self.llm_config)
         user_proxy = UserProxyAgent(
@@ -44,16 +115,21 @@ class AgenticGemini:
             code_execution_config={'work_dir': 'coding', 'use_docker': False}
         )
 
-        response = user_proxy.run(assistant, message=prompt)
+        response = user_proxy.run(assistant, **self._pair_chat_kwargs(user_proxy, assistant, prompt))
 
         response.process()
         self.logger.info('Final output:\n%s', response.summary)
 
+        return response.summary
+
     def run_coder_reviewer_chat(self):
 
+        from autogen import ConversableAgent
+
         self.logger.info('Running: Coder vs. Reviewer Chat')
 
-        prompt = input('Enter your prompt for the coder: ')
+        self._begin_run()
+        prompt = self.recorder.ask_prompt('Enter your prompt for the coder: ')
 
         coder = ConversableAgent(
             name='coder',
@@ -69,18 +145,24 @@ class AgenticGemini:
 
         response = reviewer.run(
             recipient=coder,
-            message=prompt,
-            max_turns=self.max_calls
+            **self._pair_chat_kwargs(reviewer, coder, prompt, self.max_calls)
         )
 
         response.process()
         self.logger.info('Final output:\n%s', response.summary)
 
+        return response.summary
+
     def run_group_chat_auto(self):
 
+        from autogen import ConversableAgent
+        from autogen.agentchat import run_group_chat
+        from context_compaction import build_pattern
+
         self.logger.info('Running: Orchestrated Group Chat (AutoPattern)')
 
-        prompt = input('Enter the topic for the plan: ')
+        self._begin_run()
+        prompt = self.recorder.ask_prompt('Enter the topic for the plan: ')
 
         planner_message = 'You are a senior planner. Given a topic, you create a detailed, step-by-step plan.'
         reviewer_message = 'You are a senior reviewer. You analyze the provided plan, check it for completeness and logic, and suggest up to 3 concrete improvements.'
@@ -107,26 +189,36 @@ class AgenticGemini:
             llm_config=self.llm_config,
         )
 
-        auto_selection = AutoPattern(
-            agents=[manager_agent, planner_agent, reviewer_agent],
+        agents = [manager_agent, planner_agent, reviewer_agent]
+        compactor = self._attach_history_compactor(agents)
+        auto_selection = build_pattern(
+            agents=agents,
             initial_agent=manager_agent,
-            group_manager_args={'name': 'group_manager', 'llm_config': self.llm_config},
+            speaker_selection=self.speaker_selection,
+            llm_config=self.llm_config,
+            compactor=compactor,
         )
 
         response = run_group_chat(
             pattern=auto_selection,
-            messages=prompt,
-            max_rounds=self.max_calls,
+            **self._group_chat_kwargs(agents, prompt)
         )
 
         response.process()
         self.logger.info('Final output:\n%s', response.summary)
 
+        return response.summary
+
     def run_human_in_the_loop_chat(self):
 
+        from autogen import ConversableAgent, UserProxyAgent
+        from autogen.agentchat import run_group_chat
+        from context_compaction import build_pattern
+
         self.logger.info('Running: Group Chat with Human-in-the-Loop')
 
-        prompt = input('Enter the topic for the plan (human will validate): ')
+        self._begin_run()
+        prompt = self.recorder.ask_prompt('Enter the topic for the plan (human will validate): ')
 
         planner_message = 'You are a senior planner. Given a topic, you create a detailed, step-by-step plan.'
         reviewer_message = 'You are a senior reviewer. You analyze the provided plan, check it for completeness and logic, and suggest up to 3 concrete improvements.'
@@ -162,22 +254,275 @@ class AgenticGemini:
             code_execution_config=False
         )
 
-        auto_selection = AutoPattern(
-            agents=[expert_agent, planner_agent, reviewer_agent],
+        agents = [expert_agent, planner_agent, reviewer_agent]
+        compactor = self._attach_history_compactor(agents)
+        auto_selection = build_pattern(
+            agents=agents,
             initial_agent=expert_agent,
+            speaker_selection=self.speaker_selection,
+            llm_config=self.llm_config,
+            compactor=compactor,
             user_agent=human_validator,
-            group_manager_args={'name': 'group_manager', 'llm_config': self.llm_config},
         )
 
         response = run_group_chat(
             pattern=auto_selection,
-            messages=prompt,
-            max_rounds=self.max_calls,
+            **self._group_chat_kwargs(agents + [human_validator], prompt)
         )
 
         response.process()
         self.logger.info('Final output:\n%s', response.summary)
 
+        return response.summary
+
+    def run_parallel_fanout_chat(self):
+
+        from autogen import ConversableAgent
+
+        self.logger.info('Running: Parallel Fan-Out (Coordinator, Workers, Merger)')
+
+        self._begin_run()
+        prompt = self.recorder.ask_prompt('Enter the task to split into parallel sub-tasks: ')
+
+        coordinator_message = (
+            'You are a coordinator. Split the task into independent sub-tasks that can be worked on at the same time '
+            f'without seeing each other\'s results. Use at most {self.max_subtasks} sub-tasks, and fewer if the task is small. '
+            'Reply with ONLY a JSON array of objects with "title" and "instructions" keys, no other text.'
+        )
+        worker_message = 'You are a specialist. You complete exactly the sub-task you are given, thoroughly and concisely. Other specialists handle the rest of the task.'
+        merger_message = 'You are an editor. You merge the results of several sub-tasks into one coherent, complete answer to the original task, removing overlaps and resolving contradictions.'
+
+        coordinator = ConversableAgent(
+            name='coordinator_agent',
+            system_message=coordinator_message,
+            llm_config=self.llm_config,
+        )
+
+        merger = ConversableAgent(
+            name='merger_agent',
+            system_message=merger_message,
+            llm_config=self.llm_config,
+        )
+
+        # On resume the plan and every finished worker result come from the checkpoint instead of the model.
+        subtasks = self.recorder.state['extra'].get('subtasks')
+
+        if subtasks is None:
+            subtasks = self._parse_subtasks(self._reply_text(coordinator.generate_reply(
+                messages=[{'role': 'user', 'content': prompt}],
+            )), prompt, self.max_subtasks)
+            self.recorder.set_extra('subtasks', subtasks)
+
+        print(f'Coordinator planned {len(subtasks)} sub-task(s):')
+
+        for number, subtask in enumerate(subtasks, start=1):
+            print(f'  {number}. {subtask["title"]}')
+
+        results = self.recorder.state['extra'].get('results') or [None] * len(subtasks)
+        pending = [index for index, result in enumerate(results) if result is None]
+
+        def run_worker(index: int) -> str:
+
+            # Each worker is its own agent so no conversation state is shared between threads.
+            worker = ConversableAgent(
+                name=f'worker_agent_{index + 1}',
+                system_message=worker_message,
+                llm_config=self.llm_config,
+            )
+            message = f'Overall task:\n{prompt}\n\nYour sub-task ({subtasks[index]["title"]}):\n{subtasks[index]["instructions"]}'
+
+            return self._reply_text(worker.generate_reply(messages=[{'role': 'user', 'content': message}]))
+
+        with ThreadPoolExecutor(max_workers=max(1, self.max_parallel_workers)) as pool:
+            futures = {pool.submit(run_worker, index): index for index in pending}
+
+            for future in as_completed(futures):
+                index = futures[future]
+
+                try:
+                    results[index] = future.result()
+                except Exception as e:
+                    results[index] = f'Error: sub-task failed: {str(e)}'
+
+                print(f'\n--- Sub-task {index + 1}: {subtasks[index]["title"]} ---\n{results[index]}')
+                self.recorder.set_extra('results', results)
+
+        sections = '\n\n'.join(f'## {subtask["title"]}\n{result}' for subtask, result in zip(subtasks, results))
+        summary = self._reply_text(merger.generate_reply(
+            messages=[{'role': 'user', 'content': f'Original task:\n{prompt}\n\nSub-task results:\n\n{sections}'}],
+        ))
+
+        self.logger.info('Final output:\n%s', summary)
+
+        return summary
+
+    @staticmethod
+    def _reply_text(reply) -> str:
+
+        if isinstance(reply, dict):
+            return reply.get('content') or ''
+
+        return reply or ''
+
+    @staticmethod
+    def _parse_subtasks(reply: str, prompt: str, max_subtasks: int) -> list:
+
+        match = re.search(r'\[.*\]', reply, re.DOTALL)
+
+        try:
+            items = json.loads(match.group(0)) if match else []
+        except json.JSONDecodeError:
+            items = []
+
+        subtasks = []
+
+        for number, item in enumerate(items if isinstance(items, list) else [], start=1):
+            if isinstance(item, dict) and item.get('instructions'):
+                subtasks.append({'title': str(item.get('title') or f'Sub-task {number}'), 'instructions': str(item['instructions'])})
+            elif isinstance(item, str) and item.strip():
+                subtasks.append({'title': f'Sub-task {number}', 'instructions': item})
+
+        if not subtasks:
+            # The coordinator did not produce a usable split: fall back to a single worker on the whole task.
+            subtasks = [{'title': 'Whole task', 'instructions': prompt}]
+
+        # The limit in the coordinator's prompt is only a request; anything beyond it is dropped.
+        return subtasks[:max(1, max_subtasks)]
+
+    def _pair_chat_kwargs(self, initiator, recipient, prompt: str, max_turns: int = None) -> dict:
+
+        self.recorder.track([initiator, recipient])
+
+        if not self.recorder.resumed or not self.recorder.state['messages']:
+            return {'message': prompt, 'max_turns': max_turns}
+
+        message, max_turns = self.recorder.restore_pair(initiator, recipient, max_turns)
+        self.logger.info('Resuming from checkpoint (%d message(s) restored)', len(self.recorder.state['messages']))
+
+        return {'message': message, 'max_turns': max_turns, 'clear_history': False}
+
+    def _group_chat_kwargs(self, agents: list, prompt: str) -> dict:
+
+        self.recorder.track(agents)
+
+        if not self.recorder.resumed:
+            return {'messages': prompt, 'max_rounds': self.max_calls}
+
+        messages, max_rounds = self.recorder.restore_group(self.max_calls)
+        self.logger.info('Resuming from checkpoint (%d message(s) restored)', len(messages) if isinstance(messages, list) else 0)
+
+        return {'messages': messages, 'max_rounds': max_rounds}
+
+    def _attach_history_compactor(self, agents: list):
+
+        if not self.history_token_budget:
+            return None
+
+        from context_compaction import HistoryCompactor, attach_compactor
+
+        # Older turns are summarized once the history outgrows the budget, so per-round prompt size stays flat.
+        compactor = HistoryCompactor(max_tokens=self.history_token_budget)
+        attach_compactor(agents, compactor)
+
+        return compactor
+
+    @staticmethod
+    def _tool_registry():
+
+        registry = get_tool_registry()
+
+        with AgenticGemini._registry_lock:
+            if registry.specs:
+                return registry
+
+            registry.register(AgenticGemini._find_file_path, 'Find the relative path(s) of files matching the name/pattern in /my_files. Supports automatic fuzzy matching for separators and casing.', 'read')
+            registry.register(AgenticGemini._read_file_content, 'Read the content of a file. Supports .py, .c, .ipynb, .txt, .md, .json, .csv, .pdf, .docx, etc. Content truncated at ~8k tokens. Can read specific PDF chapters or page ranges.', 'read')
+            registry.register(AgenticGemini._query_table, 'Query a .csv, .tsv, .json or .jsonl data file without reading it whole: schema, cached column stats, head/tail, filtered select and grouped aggregation.', 'read')
+            registry.register(AgenticGemini._write_file_content, 'Write (or overwrite) content to a file (.py, .c, or .ipynb), given its relative path from /my_files', 'edit')
+            registry.register(AgenticGemini._edit_file_lines, 'Replace a range of lines (1-based, inclusive) in a .py or .c file. Cheaper than rewriting the whole file.', 'edit')
+            registry.register(AgenticGemini._apply_file_patch, 'Apply a unified diff to a .py or .c file, given its relative path from /my_files', 'edit')
+            registry.register(AgenticGemini._list_notebook_cells, 'List the cells of a .ipynb notebook with index, type, size, output count and first line.', 'notebook')
+            registry.register(AgenticGemini._read_notebook_cells, 'Read a range of cells (0-based, inclusive) from a .ipynb notebook, optionally with their text outputs.', 'notebook')
+            registry.register(AgenticGemini._edit_notebook_cell, 'Replace the source (and optionally the type) of a single cell in a .ipynb notebook, keeping other cells intact.', 'notebook')
+            registry.register(AgenticGemini._insert_notebook_cell, 'Insert a new code or markdown cell at a given index of a .ipynb notebook.', 'notebook')
+            registry.register(AgenticGemini._run_python, 'Execute Python code in a persistent per-session kernel (working directory /my_files) and return its output.', 'kernel')
+            registry.register(AgenticGemini._execute_cells, 'Execute a range of code cells (0-based, inclusive) of a .ipynb notebook in the persistent session kernel and return their outputs.', 'kernel')
+            registry.register(AgenticGemini._create_file, 'Create a new empty file (.py, .c, or .ipynb), given its relative path from /my_files', 'filesystem')
+            registry.register(AgenticGemini._create_directory, 'Create a new directory, given its relative path from /my_files', 'filesystem')
+            registry.register(AgenticGemini._delete_item, 'Permanently delete a file or directory, given its relative path from /my_files', 'filesystem')
+            registry.register(AgenticGemini._copy_file, 'Copy a file/directory to the clipboard.', 'filesystem')
+            registry.register(AgenticGemini._cut_file, 'Cut (move) a file/directory to the clipboard.', 'filesystem')
+            registry.register(AgenticGemini._paste_file, 'Paste the item currently in the clipboard to a new destination.', 'filesystem')
+            registry.register(AgenticGemini._batch_file_operations, 'Run an ordered list of create_directory, create_file, delete, copy and move operations with a single confirmation, rolling everything back if one fails.', 'filesystem')
+
+            # A section is only sent when at least one of its tools is enabled for the session.
+            notebook_tools = ('_list_notebook_cells', '_read_notebook_cells', '_edit_notebook_cell', '_insert_notebook_cell')
+            approval_tools = ('_write_file_content', '_edit_file_lines', '_apply_file_patch', '_create_file', '_create_directory',
+                              '_delete_item', '_copy_file', '_cut_file', '_paste_file', '_batch_file_operations')
+
+            registry.add_section('You are an assistant that uses tools. You can interact with text-based files (e.g., .py, .c, .ipynb, .txt, .md, .json, .csv, .html, .css, .js) and document files (.pdf, .docx).')
+            registry.add_section('You have {count} tools: {tools}.')
+            registry.add_section('All file tools operate on the `/my_files` directory.')
+            registry.add_section('Dangerous operations (Write, Edit, Patch, Create, Delete, Copy, Cut, Paste, Batch) go through an approval policy: they may run immediately, prompt the user for manual verification, be denied, or (in dry-run mode) be reported without running. If denied, handle the error gracefully.', approval_tools)
+            registry.add_section('`_find_file_path` returns relative paths. Hidden files are ignored. It automatically searches for casing/separator variations.', ('_find_file_path',))
+            registry.add_section('`_read_file_content` has a limit of ~8k tokens. Larger files are truncated.', ('_read_file_content',))
+            registry.add_section('For PDF files, you can read a specific chapter by providing the `chapter` argument (matches bookmarks), or specific pages with the `pages` argument (e.g. "400" or "12-15"). Reading a few pages of a large PDF is much cheaper than reading all of it.', ('_read_file_content',))
+            registry.add_section('**For .csv, .tsv, .json and .jsonl data files, use `_query_table` instead of `_read_file_content`.** Start with `schema` or `stats` (cached per file), then use `head`/`tail`, `select` with a `where` filter, or `aggregate` with `group_by`/`aggregations`. It streams the file, so it works on files far larger than the read limit.', ('_query_table',))
+            registry.add_section('**Prefer small edits over full rewrites.** To change part of an existing .py or .c file, use `_edit_file_lines` (replace a 1-based inclusive line range) or `_apply_file_patch` (unified diff with @@ hunk headers) instead of `_write_file_content`.', ('_edit_file_lines', '_apply_file_patch'))
+            registry.add_section('For notebooks, work cell by cell: `_list_notebook_cells` shows each cell with its 0-based index and size, `_read_notebook_cells` reads a cell range (optionally with outputs), and `_edit_notebook_cell`/`_insert_notebook_cell` change or add a single cell. Outputs and metadata of the other cells are preserved.', notebook_tools)
+            registry.add_section('Prefer these over `_read_file_content`/`_write_file_content` for large notebooks.', notebook_tools)
+            registry.add_section('`_delete_item` permanently removes files or directories. Hidden files cannot be deleted.', ('_delete_item',))
+            registry.add_section('To move or copy files, use the clipboard: `_copy_file`/`_cut_file` -> `_paste_file`.', ('_copy_file', '_cut_file', '_paste_file'))
+            registry.add_section('**When a task needs more than one create/delete/copy/move, use `_batch_file_operations` with the whole ordered list.** It is validated up front, confirmed once, and rolled back if any step fails.', ('_batch_file_operations',))
+            registry.add_section('Example `operations` string: `[{"op": "create_directory", "path": "data"}, {"op": "move", "path": "a.csv", "destination": "data/a.csv"}, {"op": "copy", "path": "src", "destination": "backup/src"}, {"op": "delete", "path": "old.py"}]`', ('_batch_file_operations',))
+            registry.add_section('To run Python code or notebook cells, prefer `_run_python` and `_execute_cells`. They use a persistent kernel for this session, so variables and imports survive between calls and there is no interpreter start-up cost.', ('_run_python', '_execute_cells'))
+            registry.add_section('To *run* a .py or .c file as a program, you do not have a tool. Instead, you must **reply with a shell code block** (starting with ```sh) for the executor to run.')
+            registry.add_section('**CRITICAL: You must act as the user for any interactive script.**')
+            registry.add_section('If a script requires input, pipe it using `printf` or `echo`.')
+            registry.add_section('**You can execute .py, .c, and .ipynb files.**')
+            registry.add_section('**You must not call a tool named "run_code".**')
+            registry.add_section('**Do NOT use shell commands for file manipulation (rm, mkdir, touch, cp, mv). Use the provided tools.**')
+            registry.add_section('For `.ipynb` files, the `content` argument in `_write_file_content` must be the **raw content string**, NOT a JSON object.', ('_write_file_content',))
+            registry.add_section('To create multiple cells in a notebook, you MUST separate them with these specific delimiters:\nFor Code Cells: `# --- CELL: CODE ---`\nFor Markdown Cells: `# --- CELL: MARKDOWN ---`\nExample:\n`# --- CELL: MARKDOWN ---\n# Analysis\nHere is the analysis.\n# --- CELL: CODE ---\nprint("Hello")`', ('_write_file_content',))
+            registry.add_section('The script will be executed with `/my_files` as the working directory, so use relative paths.')
+            registry.add_section('When the operation is successful and the task is done, reply with TERMINATE.')
+
+        return registry
+
+    def _close_workspace(self) -> None:
+
+        workspace = getattr(AgenticGemini._session, 'workspace', None)
+        AgenticGemini._session.workspace = None
+
+        if workspace is None:
+            return
+
+        changes = workspace.changes()
+        changed = [(kind, path) for kind in ('added', 'modified', 'deleted') for path in changes[kind]]
+        commit = self.workspace_on_exit == 'commit' and bool(changed)
+
+        if changed and self.workspace_on_exit == 'ask':
+            print(f'Session workspace has {len(changed)} change(s):')
+
+            for kind, path in changed[:50]:
+                print(f'  {kind.upper()}: {path}')
+
+            if len(changed) > 50:
+                print(f'  ... and {len(changed) - 50} more')
+
+            commit = input(f'Type "YES" to commit these changes to {BASE_DIR} (anything else discards them): ') == 'YES'
+
+        result = get_workspace_manager().close(self.session_id, commit)
+
+        if commit:
+            self.logger.info('Committed %d workspace change(s) to %s', len(changed), BASE_DIR)
+
+            for path in result.get('conflicts', []):
+                self.logger.warning('Not committed, changed in %s by someone else meanwhile: %s', BASE_DIR, path)
+
+        elif changed:
+            self.logger.info('Discarded %d workspace change(s)', len(changed))
+
     @staticmethod
     def _get_readable_extensions() -> set:
 
@@ -188,10 +533,34 @@ class AgenticGemini:
 
         return {'.py', '.c', '.ipynb'}
 
+    @staticmethod
+    def _base_dir() -> str:
+
+        workspace = getattr(AgenticGemini._session, 'workspace', None)
+
+        return workspace.path if workspace else BASE_DIR
+
+    @staticmethod
+    def _clipboard() -> dict:
+
+        clipboard = getattr(AgenticGemini._session, 'clipboard', None)
+
+        if clipboard is None:
+            clipboard = AgenticGemini._session.clipboard = {'src': None, 'op': None}
+
+        return clipboard
+
+    @staticmethod
+    def _logical_path(absolute_path: str) -> str:
+
+        workspace = getattr(AgenticGemini._session, 'workspace', None)
+
+        return workspace.logical_path(absolute_path) if workspace else absolute_path
+
     @staticmethod
     def _get_absolute_path(relative_path: str) -> str:
 
-        base_dir = '/my_files'
+        base_dir = AgenticGemini._base_dir()
 
         if relative_path.startswith('/'):
             relative_path = relative_path[1:]
@@ -201,7 +570,7 @@ class AgenticGemini:
     @staticmethod
     def _find_file_path(file_name: Annotated[str, 'The name (or partial name) of the file to find, e.g., main.c or GitHub Recovery Codes']) -> str:
 
-        directory_path = '/my_files'
+        directory_path = AgenticGemini._base_dir()
         target_base, target_ext = os.path.splitext(file_name)
         normalized_target = target_base.lower().replace('_', '').replace('-', '').replace(' ', '')
 
@@ -233,21 +602,10 @@ class AgenticGemini:
 
         return '\n'.join(found_files)
 
-    @staticmethod
-    def _flatten_pdf_outline(outline):
-
-        flat_list = []
-        for item in outline:
-            if isinstance(item, list):
-                flat_list.extend(AgenticGemini._flatten_pdf_outline(item))
-            else:
-                flat_list.append(item)
-
-        return flat_list
-
     @staticmethod
     def _read_file_content(relative_path: Annotated[str, 'The relative path from /my_files'],
-                           chapter: Annotated[str, 'The specific chapter title to read (PDF only)'] = None) -> str:
+                           chapter: Annotated[str, 'The specific chapter title to read (PDF only)'] = None,
+                           pages: Annotated[str, 'Page or page range to read, e.g. "400" or "12-15" (PDF only, 1-based)'] = None) -> str:
 
         absolute_path = AgenticGemini._get_absolute_path(relative_path)
         ext = os.path.splitext(absolute_path)[1]
@@ -257,7 +615,7 @@ class AgenticGemini:
 
             return f'Error: File type {ext} is not allowed. Supported types: {AgenticGemini._get_readable_extensions()}'
 
-        if not absolute_path.startswith('/my_files'):
+        if not absolute_path.startswith(AgenticGemini._base_dir()):
 
             return 'Error: Path traversal detected. Access denied.'
 
@@ -268,76 +626,71 @@ class AgenticGemini:
         try:
             content = ''
 
-            if ext == '.ipynb':
-                with open(absolute_path, 'r', encoding='utf-8') as f:
-                    notebook = nbformat.read(f, as_version=4)
-
-                content_parts = []
+            if ext in CONVERTIBLE_EXTENSIONS:
+                try:
+                    sidecar = AgenticGemini._open_sidecar(absolute_path)
 
-                for cell in notebook.cells:
-                    if cell.cell_type == 'code':
-                        content_parts.append(f'# --- CELL: CODE ---\n{cell.source}')
-                    elif cell.cell_type == 'markdown':
-                        content_parts.append(f'# --- CELL: MARKDOWN ---\n{cell.source}')
+                except ImportError as e:
+                    library = {'docx': 'python-docx'}.get(e.name, e.name)
 
-                if not content_parts:
+                    return f'Error: {library} library not installed. Cannot read {ext} files.'
 
-                    return 'Notebook contains no cells.'
+                except Exception as e:
 
-                content = '\n\n'.join(content_parts)
+                    return f'Error reading {ext[1:].upper()}: {str(e)}'
 
-            elif ext == '.pdf':
                 try:
-                    reader = pypdf.PdfReader(absolute_path)
-                    start_page = 0
-                    end_page = len(reader.pages)
-
-                    if chapter:
-                        outline = AgenticGemini._flatten_pdf_outline(reader.outline)
-                        found_chapter = False
-
-                        for i, node in enumerate(outline):
-                            if chapter.lower() in node.title.lower():
-                                try:
-                                    start_page = reader.get_destination_page_number(node)
-                                    found_chapter = True
-                                    if i + 1 < len(outline):
-                                        end_page = reader.get_destination_page_number(outline[i + 1])
-                                    break
-                                except Exception:
-                                    continue
-
-                        if not found_chapter:
-
-                            return f'Error: Chapter "{chapter}" not found in PDF outline.'
-
-                    pages_text = []
-                    for i in range(start_page, end_page):
-                        text = reader.pages[i].extract_text()
-                        if text:
-                            pages_text.append(text)
-                    content = '\n'.join(pages_text)
+                    with phase('sidecar_read'):
+                        start_page, end_page = 0, len(sidecar)
 
-                except Exception as e:
+                        if ext == '.ipynb' and not len(sidecar):
 
-                    return f'Error reading PDF: {str(e)}'
+                            return 'Notebook contains no cells.'
 
-            elif ext == '.docx':
-                try:
-                    import docx
-                    doc = docx.Document(absolute_path)
-                    content = '\n'.join([p.text for p in doc.paragraphs])
+                        if chapter:
+                            matches = [i for i, (title, _) in enumerate(sidecar.outline) if chapter.lower() in title.lower()]
+
+                            if not matches:
+
+                                return f'Error: Chapter "{chapter}" not found in PDF outline.'
+
+                            start_page = sidecar.outline[matches[0]][1]
 
-                except ImportError:
+                            if matches[0] + 1 < len(sidecar.outline):
+                                end_page = sidecar.outline[matches[0] + 1][1]
 
-                    return 'Error: python-docx library not installed. Cannot read .docx files.'
+                        if pages:
+                            match = re.fullmatch(r'\s*(\d+)\s*(?:-\s*(\d+)\s*)?', pages)
+
+                            if not match:
+
+                                return f'Error: Invalid page range "{pages}". Use e.g. "400" or "12-15".'
+
+                            start_page = int(match.group(1)) - 1
+                            end_page = int(match.group(2) or match.group(1))
+
+                            if start_page < 0 or start_page >= len(sidecar) or end_page <= start_page:
+
+                                return f'Error: Page range {pages} out of bounds. The document has {len(sidecar)} pages.'
+
+                        separator = '\n\n' if ext == '.ipynb' else '\n'
+                        texts = [text for _, text in sidecar.texts(start_page, end_page, char_limit)
+                                 if text or ext != '.pdf']
+                        content = separator.join(texts)
+
+                finally:
+                    sidecar.close()
 
             else:
-                with open(absolute_path, 'r') as f:
+                with phase('file_read'), open(absolute_path, 'r') as f:
                     content = f.read()
 
             if len(content) > char_limit:
                 warning = f'\n\n[WARNING: Content truncated. Original size > {char_limit} characters (~8192 tokens).]'
+
+                if ext in table_query.TABLE_EXTENSIONS:
+                    warning += '\n[Use _query_table to inspect the whole dataset (schema, stats, filters, aggregations).]'
+
                 return content[:char_limit] + warning
 
             return content
@@ -346,6 +699,144 @@ class AgenticGemini:
 
             return f'Error reading file: {str(e)}'
 
+    @staticmethod
+    def _open_sidecar(absolute_path: str):
+
+        cache = get_document_cache()
+        logical_path = AgenticGemini._logical_path(absolute_path)
+        sidecar = cache.get(absolute_path, logical_path)
+
+        if sidecar is None:
+            # First read (or the file changed): parse once, later reads only seek into the sidecar.
+            with phase(f'{os.path.splitext(absolute_path)[1][1:]}_parse'):
+                sidecar = cache.build(absolute_path, logical_path)
+
+        return sidecar
+
+    @staticmethod
+    def _schedule_conversion(absolute_path: str) -> None:
+
+        # Converted in the background while the agent works on, so the first read of a new or changed document is a seek.
+        get_document_cache().schedule(absolute_path, AgenticGemini._logical_path(absolute_path))
+
+    @staticmethod
+    def _query_table(relative_path: Annotated[str, 'The relative path of the .csv, .tsv, .json or .jsonl file from /my_files'],
+                     operation: Annotated[str, 'One of: schema, stats, head, tail, select, aggregate'],
+                     columns: Annotated[str, 'Comma-separated columns to return (head/tail/select) or describe (stats). Empty means all'] = None,
+                     where: Annotated[str, 'Optional row filter, e.g. "price > 100 and country == \'DE\'". Use col("Column name") for names with spaces'] = None,
+                     group_by: Annotated[str, 'Comma-separated columns to group by (aggregate only)'] = None,
+                     aggregations: Annotated[str, 'Comma-separated aggregations (aggregate only): count, sum:col, avg:col, min:col, max:col, distinct:col'] = None,
+                     limit: Annotated[int, 'Maximum number of rows or groups to return (default 20, max 1000)'] = 20) -> str:
+
+        absolute_path = AgenticGemini._get_absolute_path(relative_path)
+        ext = os.path.splitext(absolute_path)[1].lower()
+
+        if ext not in table_query.TABLE_EXTENSIONS:
+
+            return f'Error: _query_table supports {sorted(table_query.TABLE_EXTENSIONS)}, not {ext}.'
+
+        if not absolute_path.startswith(AgenticGemini._base_dir()):
+
+            return 'Error: Path traversal detected. Access denied.'
+
+        if not os.path.isfile(absolute_path):
+
+            return f'Error: File not found at path: {absolute_path}'
+
+        try:
+            with phase('table_query'):
+                return table_query.query(
+                    absolute_path,
+                    operation,
+                    columns=columns,
+                    where=where,
+                    group_by=group_by,
+                    aggregations=aggregations,
+                    limit=limit,
+                    cache_dir=get_document_cache().cache_dir,
+                    logical_path=AgenticGemini._logical_path(absolute_path),
+                )
+
+        except ValueError as e:
+
+            return f'Error: {str(e)}'
+
+        except Exception as e:
+
+            return f'Error querying table: {str(e)}'
+
+    @staticmethod
+    def _path_size(absolute_path: str) -> int:
+
+        if not os.path.exists(absolute_path):
+
+            return None
+
+        if not os.path.isdir(absolute_path):
+
+            return os.path.getsize(absolute_path)
+
+        total = 0
+        for root, _, files in os.walk(absolute_path):
+            for f in files:
+                try:
+                    total += os.path.getsize(os.path.join(root, f))
+                except OSError:
+                    pass
+
+        return total
+
+    @staticmethod
+    def _request_approval(description: str, checks: list, details: str = None) -> str:
+
+        policy = AgenticGemini.approval_policy
+        session_id = AgenticGemini._current_session_id()
+        # Rules are written against /my_files paths, also when the session works in its own workspace.
+        checks = [(operation, [AgenticGemini._logical_path(path) for path in paths], size) for operation, paths, size in checks]
+        decisions = [(operation, paths) + policy.decide(session_id, operation, paths, size) for operation, paths, size in checks]
+
+        if any(decision == 'deny' for _, _, decision, _ in decisions):
+            outcome = 'deny'
+        elif all(decision == 'allow' for _, _, decision, _ in decisions):
+            outcome = 'allow'
+        else:
+            outcome = 'ask'
+
+        if policy.dry_run:
+            for operation, paths, decision, reason in decisions:
+                policy.audit(session_id, operation, paths, decision, reason, approved=False)
+
+            return f'Dry run: would {description} (policy decision: {outcome}). No changes were made.'
+
+        approved = outcome == 'allow'
+        user_reason = None
+
+        if outcome == 'ask':
+            print(f'VERIFICATION REQUIRED: Agent wants to {description}')
+            if details:
+                print(details)
+            user_verification = input('Type "YES" to confirm (or "ALWAYS" to allow this for the rest of the session): ')
+            approved = user_verification in ('YES', 'ALWAYS')
+            user_reason = 'user (always)' if user_verification == 'ALWAYS' else 'user'
+
+            if user_verification == 'ALWAYS':
+                for operation, paths, _, _ in decisions:
+                    policy.allow_for_session(session_id, operation, paths)
+
+        for operation, paths, decision, reason in decisions:
+            policy.audit(session_id, operation, paths, decision, user_reason or reason, approved)
+
+        if outcome == 'deny':
+            reasons = ', '.join(sorted({reason for _, _, decision, reason in decisions if decision == 'deny'}))
+
+            return f'Error: Operation denied by approval policy ({reasons}).'
+
+        if not approved:
+
+            return 'Error: User denied the operation.'
+
+        return None
+
     @staticmethod
     def _write_file_content(relative_path: Annotated[str, 'The relative path from /my_files'],
                             content: Annotated[str, 'The new content to write to the file']) -> str:
@@ -357,7 +848,7 @@ class AgenticGemini:
 
             return f'Error: File type {ext} is not writable. Only .py, .c, and .ipynb are editable.'
 
-        if not absolute_path.startswith('/my_files'):
+        if not absolute_path.startswith(AgenticGemini._base_dir()):
 
             return 'Error: Path traversal detected. Access denied.'
 
@@ -365,17 +856,21 @@ class AgenticGemini:
 
             return 'Error: Cannot edit hidden files.'
 
-        print(f'VERIFICATION REQUIRED: Agent wants to OVERWRITE/EDIT file: {absolute_path}')
-        user_verification = input('Type "YES" to confirm: ')
+        denial = AgenticGemini._request_approval(
+            f'OVERWRITE/EDIT file: {absolute_path}',
+            [('write', [absolute_path], len(content.encode('utf-8')))],
+        )
 
-        if user_verification != 'YES':
+        if denial:
 
-            return 'Error: User denied the operation.'
+            return denial
 
         try:
             os.makedirs(os.path.dirname(absolute_path), exist_ok=True)
 
             if ext == '.ipynb':
+                from nbformat.v4 import new_notebook, new_code_cell, new_markdown_cell
+
                 notebook = new_notebook()
                 segments = re.split(r'(# --- CELL: (?:CODE|MARKDOWN) ---)', content)
                 iter_segments = iter(segments)
@@ -391,12 +886,13 @@ class AgenticGemini:
                     else:
                         notebook.cells.append(new_code_cell(cell_source))
 
-                with open(absolute_path, 'w', encoding='utf-8') as f:
-                    nbformat.write(notebook, f)
+                if os.path.exists(absolute_path):
+                    notebook = AgenticGemini._merge_notebook_cells(absolute_path, notebook)
+
+                AgenticGemini._save_notebook(absolute_path, notebook)
 
             else:
-                with open(absolute_path, 'w') as f:
-                    f.write(content)
+                AgenticGemini._atomic_write(absolute_path, content)
 
             return f'Successfully wrote to {absolute_path}'
 
@@ -405,175 +901,803 @@ class AgenticGemini:
             return f'Error writing file: {str(e)}'
 
     @staticmethod
-    def _create_file(relative_path: Annotated[str, 'The path of the new file']) -> str:
+    def _atomic_write(absolute_path: str, content: str) -> None:
 
-        absolute_path = AgenticGemini._get_absolute_path(relative_path)
-        ext = os.path.splitext(absolute_path)[1]
+        directory = os.path.dirname(absolute_path)
+        fd, temp_path = tempfile.mkstemp(dir=directory, prefix=f'.{os.path.basename(absolute_path)}.', suffix='.tmp')
 
-        if ext not in AgenticGemini._get_editable_extensions():
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8', newline='') as f:
+                f.write(content)
+                f.flush()
+                os.fsync(f.fileno())
 
-            return f'Error: Cannot create file type {ext}. Only .py, .c, and .ipynb are supported for creation.'
+            if os.path.exists(absolute_path):
+                shutil.copymode(absolute_path, temp_path)
+            else:
+                os.chmod(temp_path, 0o666 & ~_UMASK)
 
-        if not absolute_path.startswith('/my_files'):
+            os.replace(temp_path, absolute_path)
 
-            return 'Error: Path traversal detected. Access denied.'
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
 
-        if os.path.basename(absolute_path).startswith('.'):
+    @staticmethod
+    def _load_notebook(absolute_path: str):
 
-            return 'Error: Cannot create hidden files.'
+        stat = os.stat(absolute_path)
+        key = (stat.st_mtime_ns, stat.st_size)
 
-        print(f'VERIFICATION REQUIRED: Agent wants to CREATE file: {absolute_path}')
-        user_verification = input('Type "YES" to confirm: ')
+        with AgenticGemini._notebook_cache_lock:
+            cached = AgenticGemini._notebook_cache.get(absolute_path)
 
-        if user_verification != 'YES':
+            if cached and cached[0] == key:
+                AgenticGemini._notebook_cache.move_to_end(absolute_path)
 
-            return 'Error: User denied the operation.'
+                # Callers edit the notebook in place before saving; a copy keeps the cached one intact if the save fails.
+                return copy.deepcopy(cached[1])
 
-        try:
-            os.makedirs(os.path.dirname(absolute_path), exist_ok=True)
+        with phase('notebook_parse'), open(absolute_path, 'r', encoding='utf-8') as f:
+            raw = json.load(f)
 
-            with open(absolute_path, 'w') as f:
-                pass
+        import nbformat
+        from nbformat.v4.rwbase import rejoin_lines, strip_transient
 
-            return f'Successfully created file {absolute_path}'
+        # Version 4 notebooks skip nbformat's schema validation, which dominates load time on large notebooks.
+        if raw.get('nbformat') == 4:
+            notebook = strip_transient(rejoin_lines(nbformat.from_dict(raw)))
+        else:
+            notebook = nbformat.reads(json.dumps(raw), as_version=4)
 
-        except Exception as e:
+        AgenticGemini._cache_notebook(absolute_path, key, copy.deepcopy(notebook))
 
-            return f'Error creating file: {str(e)}'
+        return notebook
 
     @staticmethod
-    def _create_directory(relative_path: Annotated[str, 'The directory path to create inside /my_files']) -> str:
+    def _cache_notebook(absolute_path: str, key: tuple, notebook) -> None:
 
-        absolute_path = AgenticGemini._get_absolute_path(relative_path)
+        with AgenticGemini._notebook_cache_lock:
+            AgenticGemini._notebook_cache[absolute_path] = (key, notebook)
+            AgenticGemini._notebook_cache.move_to_end(absolute_path)
 
-        if not absolute_path.startswith('/my_files'):
+            while len(AgenticGemini._notebook_cache) > AgenticGemini._notebook_cache_size:
+                AgenticGemini._notebook_cache.popitem(last=False)
 
-            return 'Error: Path traversal detected. Access denied.'
+    @staticmethod
+    def _save_notebook(absolute_path: str, notebook) -> None:
 
-        if os.path.basename(absolute_path).startswith('.'):
+        import nbformat
 
-            return 'Error: Cannot create hidden directories.'
+        try:
+            AgenticGemini._atomic_write(absolute_path, nbformat.writes(notebook) + '\n')
 
-        print(f'VERIFICATION REQUIRED: Agent wants to CREATE directory: {absolute_path}')
-        user_verification = input('Type "YES" to confirm: ')
+        except BaseException:
+            with AgenticGemini._notebook_cache_lock:
+                AgenticGemini._notebook_cache.pop(absolute_path, None)
+            raise
 
-        if user_verification != 'YES':
+        stat = os.stat(absolute_path)
+        AgenticGemini._cache_notebook(absolute_path, (stat.st_mtime_ns, stat.st_size), copy.deepcopy(notebook))
+        AgenticGemini._schedule_conversion(absolute_path)
 
-            return 'Error: User denied the operation.'
+    @staticmethod
+    def _merge_notebook_cells(absolute_path: str, notebook):
 
-        try:
-            os.makedirs(absolute_path, exist_ok=True)
+        existing = AgenticGemini._load_notebook(absolute_path)
 
-            return f'Successfully created directory {absolute_path}'
+        unchanged = {}
+        for cell in existing.cells:
+            unchanged.setdefault((cell.cell_type, cell.source.strip()), []).append(cell)
 
-        except Exception as e:
+        merged_cells = []
+        for cell in notebook.cells:
+            matches = unchanged.get((cell.cell_type, cell.source.strip()))
+            merged_cells.append(matches.pop(0) if matches else cell)
 
-            return f'Error creating directory: {str(e)}'
+        existing.cells = merged_cells
+
+        return existing
 
     @staticmethod
-    def _delete_item(relative_path: Annotated[str, 'The path to the file or directory to delete']) -> str:
+    def _check_editable_path(absolute_path: str) -> str:
 
-        absolute_path = AgenticGemini._get_absolute_path(relative_path)
+        ext = os.path.splitext(absolute_path)[1]
+
+        if ext not in AgenticGemini._get_editable_extensions():
+
+            return f'Error: File type {ext} is not writable. Only .py, .c, and .ipynb are editable.'
 
-        if not absolute_path.startswith('/my_files'):
+        if not absolute_path.startswith(AgenticGemini._base_dir()):
 
             return 'Error: Path traversal detected. Access denied.'
 
         if os.path.basename(absolute_path).startswith('.'):
 
-            return 'Error: Cannot delete hidden files or directories.'
+            return 'Error: Cannot edit hidden files.'
 
         if not os.path.exists(absolute_path):
 
-            return f'Error: Path not found: {absolute_path}'
+            return f'Error: File not found at path: {absolute_path}'
 
-        print(f'VERIFICATION REQUIRED: Agent wants to DELETE: {absolute_path}')
-        user_verification = input('Type "YES" to confirm: ')
+        return None
 
-        if user_verification != 'YES':
+    @staticmethod
+    def _edit_file_lines(relative_path: Annotated[str, 'The relative path from /my_files'],
+                         start_line: Annotated[int, 'The first line to replace (1-based)'],
+                         end_line: Annotated[int, 'The last line to replace (inclusive). Use start_line - 1 to insert before start_line without removing anything'],
+                         new_content: Annotated[str, 'The text that replaces the line range (may be empty to delete the lines)']) -> str:
 
-            return 'Error: User denied the operation.'
+        absolute_path = AgenticGemini._get_absolute_path(relative_path)
+        error = AgenticGemini._check_editable_path(absolute_path)
 
-        try:
-            if os.path.isdir(absolute_path):
-                shutil.rmtree(absolute_path)
-            else:
-                os.remove(absolute_path)
+        if error:
 
-            return f'Successfully deleted {absolute_path}'
+            return error
 
-        except Exception as e:
+        if absolute_path.endswith('.ipynb'):
 
-            return f'Error deleting item: {str(e)}'
+            return 'Error: Use _edit_notebook_cell to edit notebook cells.'
 
-    @staticmethod
-    def _copy_file(relative_path: Annotated[str, 'The path to the file or directory to copy to clipboard']) -> str:
+        try:
+            with open(absolute_path, 'r', encoding='utf-8', newline='') as f:
+                lines = f.read().splitlines(keepends=True)
 
-        absolute_path = AgenticGemini._get_absolute_path(relative_path)
+        except Exception as e:
 
-        if not absolute_path.startswith('/my_files'):
+            return f'Error reading file: {str(e)}'
 
-            return 'Error: Path traversal detected. Access denied.'
+        if start_line < 1 or start_line > len(lines) + 1 or end_line < start_line - 1 or end_line > len(lines):
 
-        if os.path.basename(absolute_path).startswith('.'):
+            return f'Error: Invalid line range {start_line}-{end_line}. The file has {len(lines)} lines.'
 
-            return 'Error: Cannot copy hidden files or directories.'
+        replacement = new_content.splitlines(keepends=True)
+        # Keep the line break the replaced (or preceding) line had, including the file's trailing newline.
+        keeps_newline = end_line < len(lines) or (end_line and lines[end_line - 1].endswith(('\n', '\r')))
 
-        if not os.path.exists(absolute_path):
+        if replacement and not replacement[-1].endswith(('\n', '\r')) and keeps_newline:
+            replacement[-1] += '\n'
 
-            return f'Error: Path not found: {absolute_path}'
+        denial = AgenticGemini._request_approval(
+            f'EDIT lines {start_line}-{end_line} of file: {absolute_path}',
+            [('edit', [absolute_path], len(new_content.encode('utf-8')))],
+            details=''.join(difflib.unified_diff(lines[start_line - 1:end_line], replacement, 'before', 'after')),
+        )
 
-        print(f'VERIFICATION REQUIRED: Agent wants to COPY to clipboard: {absolute_path}')
-        user_verification = input('Type "YES" to confirm: ')
+        if denial:
 
-        if user_verification != 'YES':
+            return denial
 
-            return 'Error: User denied the operation.'
+        try:
+            lines[start_line - 1:end_line] = replacement
+            AgenticGemini._atomic_write(absolute_path, ''.join(lines))
 
-        AgenticGemini._clipboard_src = absolute_path
-        AgenticGemini._clipboard_op = 'COPY'
+            return f'Successfully edited lines {start_line}-{end_line} of {absolute_path}'
 
-        return f'Item copied to clipboard: {absolute_path}. Use paste_file to complete operation.'
+        except Exception as e:
+
+            return f'Error writing file: {str(e)}'
 
     @staticmethod
-    def _cut_file(relative_path: Annotated[str, 'The path to the file or directory to cut (move) to clipboard']) -> str:
+    def _apply_unified_diff(lines: list, diff: str) -> list:
 
-        absolute_path = AgenticGemini._get_absolute_path(relative_path)
+        hunk_header = re.compile(r'^@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@')
+        hunks = []
+        last_sides = ()
 
-        if not absolute_path.startswith('/my_files'):
+        for diff_line in diff.splitlines(keepends=True):
+            match = hunk_header.match(diff_line)
 
-            return 'Error: Path traversal detected. Access denied.'
+            if match:
+                hunks.append({'start': int(match.group(1)), 'old': [], 'new': []})
+                last_sides = ()
+                continue
 
-        if os.path.basename(absolute_path).startswith('.'):
+            if not hunks:
+                continue
 
-            return 'Error: Cannot cut hidden files or directories.'
+            if diff_line.startswith('\\'):
+                for side in last_sides:
+                    hunks[-1][side][-1] = hunks[-1][side][-1].rstrip('\r\n')
+                continue
 
-        if not os.path.exists(absolute_path):
+            marker, text = diff_line[:1], diff_line[1:]
+
+            if not text.endswith(('\n', '\r')):
+                text += '\n'
+
+            if marker in (' ', '\n', '\r'):
+                last_sides = ('old', 'new')
+            elif marker == '-':
+                last_sides = ('old',)
+            elif marker == '+':
+                last_sides = ('new',)
+            else:
+                continue
+
+            for side in last_sides:
+                hunks[-1][side].append(text)
+
+        if not hunks:
+            raise ValueError('No hunks found. Provide a unified diff with @@ -start,count +start,count @@ headers.')
+
+        result = list(lines)
+        offset = 0
+
+        for number, hunk in enumerate(hunks, start=1):
+            expected = max(hunk['start'] - 1, 0) + offset if hunk['old'] else hunk['start'] + offset
+            old_block = [line.rstrip('\r\n') for line in hunk['old']]
+            position = None
+
+            for candidate in sorted(range(len(result) - len(old_block) + 1), key=lambda i: abs(i - expected)):
+                if [line.rstrip('\r\n') for line in result[candidate:candidate + len(old_block)]] == old_block:
+                    position = candidate
+                    break
+
+            if position is None:
+                raise ValueError(f'Hunk {number} does not match the current file content.')
+
+            result[position:position + len(old_block)] = hunk['new']
+            offset += position - expected + len(hunk['new']) - len(old_block)
+
+        return result
+
+    @staticmethod
+    def _apply_file_patch(relative_path: Annotated[str, 'The relative path from /my_files'],
+                          diff: Annotated[str, 'A unified diff (with @@ hunk headers) describing the change to apply']) -> str:
+
+        absolute_path = AgenticGemini._get_absolute_path(relative_path)
+        error = AgenticGemini._check_editable_path(absolute_path)
+
+        if error:
+
+            return error
+
+        if absolute_path.endswith('.ipynb'):
+
+            return 'Error: Use _edit_notebook_cell to edit notebook cells.'
+
+        try:
+            with open(absolute_path, 'r', encoding='utf-8', newline='') as f:
+                lines = f.read().splitlines(keepends=True)
+
+        except Exception as e:
+
+            return f'Error reading file: {str(e)}'
+
+        try:
+            patched = AgenticGemini._apply_unified_diff(lines, diff)
+
+        except ValueError as e:
+
+            return f'Error applying patch: {str(e)}'
+
+        denial = AgenticGemini._request_approval(
+            f'PATCH file: {absolute_path}',
+            [('edit', [absolute_path], len(diff.encode('utf-8')))],
+            details=diff,
+        )
+
+        if denial:
+
+            return denial
+
+        try:
+            AgenticGemini._atomic_write(absolute_path, ''.join(patched))
+
+            return f'Successfully patched {absolute_path}'
+
+        except Exception as e:
+
+            return f'Error writing file: {str(e)}'
+
+    @staticmethod
+    def _edit_notebook_cell(relative_path: Annotated[str, 'The relative path of the .ipynb file from /my_files'],
+                            cell_index: Annotated[int, 'The index of the cell to replace (0-based)'],
+                            source: Annotated[str, 'The new source of the cell'],
+                            cell_type: Annotated[str, 'Optional new cell type: code or markdown'] = None) -> str:
+
+        absolute_path = AgenticGemini._get_absolute_path(relative_path)
+        error = AgenticGemini._check_editable_path(absolute_path)
+
+        if error:
+
+            return error
+
+        if not absolute_path.endswith('.ipynb'):
+
+            return 'Error: _edit_notebook_cell only supports .ipynb files.'
+
+        if cell_type not in (None, 'code', 'markdown'):
+
+            return f'Error: Unsupported cell type: {cell_type}. Use code or markdown.'
+
+        try:
+            notebook = AgenticGemini._load_notebook(absolute_path)
+
+        except Exception as e:
+
+            return f'Error reading notebook: {str(e)}'
+
+        if cell_index < 0 or cell_index >= len(notebook.cells):
+
+            return f'Error: Cell index {cell_index} out of range. The notebook has {len(notebook.cells)} cells.'
+
+        denial = AgenticGemini._request_approval(
+            f'EDIT cell {cell_index} of notebook: {absolute_path}',
+            [('edit', [absolute_path], len(source.encode('utf-8')))],
+        )
+
+        if denial:
+
+            return denial
+
+        try:
+            cell = notebook.cells[cell_index]
+
+            if cell_type and cell_type != cell.cell_type:
+                from nbformat.v4 import new_code_cell, new_markdown_cell
+
+                cell = new_code_cell(source) if cell_type == 'code' else new_markdown_cell(source)
+                notebook.cells[cell_index] = cell
+            else:
+                cell.source = source
+
+            AgenticGemini._save_notebook(absolute_path, notebook)
+
+            return f'Successfully edited cell {cell_index} of {absolute_path}'
+
+        except Exception as e:
+
+            return f'Error writing file: {str(e)}'
+
+    @staticmethod
+    def _check_notebook_path(absolute_path: str) -> str:
+
+        if not absolute_path.endswith('.ipynb'):
+
+            return 'Error: Only .ipynb files are supported.'
+
+        if not absolute_path.startswith(AgenticGemini._base_dir()):
+
+            return 'Error: Path traversal detected. Access denied.'
+
+        if not os.path.exists(absolute_path):
+
+            return f'Error: File not found at path: {absolute_path}'
+
+        return None
+
+    @staticmethod
+    def _list_notebook_cells(relative_path: Annotated[str, 'The relative path of the .ipynb file from /my_files']) -> str:
+
+        absolute_path = AgenticGemini._get_absolute_path(relative_path)
+        error = AgenticGemini._check_notebook_path(absolute_path)
+
+        if error:
+
+            return error
+
+        try:
+            notebook = AgenticGemini._load_notebook(absolute_path)
+
+        except Exception as e:
+
+            return f'Error reading notebook: {str(e)}'
+
+        if not notebook.cells:
+
+            return 'Notebook contains no cells.'
+
+        rows = [f'{len(notebook.cells)} cells (index | type | lines | chars | outputs | execution_count | first line)']
+
+        for index, cell in enumerate(notebook.cells):
+            first_line = next((line.strip() for line in cell.source.splitlines() if line.strip()), '')
+            outputs = len(cell.get('outputs', []))
+            execution_count = cell.get('execution_count')
+            rows.append(f'{index} | {cell.cell_type} | {len(cell.source.splitlines())} | {len(cell.source)} | {outputs} | {execution_count} | {first_line[:80]}')
+
+        return '\n'.join(rows)
+
+    @staticmethod
+    def _format_cell_outputs(cell, char_limit: int = 2048) -> str:
+
+        parts = []
+
+        for output in cell.get('outputs', []):
+            if output.get('output_type') == 'stream':
+                parts.append(output.get('text', ''))
+            elif output.get('output_type') in ('execute_result', 'display_data'):
+                parts.append(output.get('data', {}).get('text/plain', f'<{", ".join(output.get("data", {}).keys())}>'))
+            elif output.get('output_type') == 'error':
+                parts.append(f'{output.get("ename")}: {output.get("evalue")}')
+
+        text = ''.join(part if isinstance(part, str) else ''.join(part) for part in parts)
+
+        if len(text) > char_limit:
+            text = text[:char_limit] + '\n[output truncated]'
+
+        return text
+
+    @staticmethod
+    def _read_notebook_cells(relative_path: Annotated[str, 'The relative path of the .ipynb file from /my_files'],
+                             start_index: Annotated[int, 'The first cell to read (0-based)'],
+                             end_index: Annotated[int, 'The last cell to read (inclusive). Defaults to start_index'] = None,
+                             include_outputs: Annotated[bool, 'Include the text outputs of code cells'] = False) -> str:
+
+        absolute_path = AgenticGemini._get_absolute_path(relative_path)
+        error = AgenticGemini._check_notebook_path(absolute_path)
+        char_limit = 65536
+
+        if error:
+
+            return error
+
+        try:
+            notebook = AgenticGemini._load_notebook(absolute_path)
+
+        except Exception as e:
+
+            return f'Error reading notebook: {str(e)}'
+
+        if end_index is None:
+            end_index = start_index
+
+        if start_index < 0 or end_index < start_index or end_index >= len(notebook.cells):
+
+            return f'Error: Invalid cell range {start_index}-{end_index}. The notebook has {len(notebook.cells)} cells.'
+
+        content_parts = []
+
+        for index in range(start_index, end_index + 1):
+            cell = notebook.cells[index]
+            content_parts.append(f'# --- CELL {index}: {cell.cell_type.upper()} ---\n{cell.source}')
+
+            if include_outputs and cell.cell_type == 'code':
+                outputs = AgenticGemini._format_cell_outputs(cell)
+                if outputs:
+                    content_parts.append(f'# --- OUTPUT {index} ---\n{outputs}')
+
+        content = '\n\n'.join(content_parts)
+
+        if len(content) > char_limit:
+            warning = f'\n\n[WARNING: Content truncated. Original size > {char_limit} characters (~8192 tokens). Read a smaller cell range.]'
+            return content[:char_limit] + warning
+
+        return content
+
+    @staticmethod
+    def _insert_notebook_cell(relative_path: Annotated[str, 'The relative path of the .ipynb file from /my_files'],
+                              index: Annotated[int, 'The position of the new cell (0-based). Use the cell count to append'],
+                              source: Annotated[str, 'The source of the new cell'],
+                              cell_type: Annotated[str, 'The cell type: code or markdown'] = 'code') -> str:
+
+        absolute_path = AgenticGemini._get_absolute_path(relative_path)
+        error = AgenticGemini._check_editable_path(absolute_path)
+
+        if error:
+
+            return error
+
+        if not absolute_path.endswith('.ipynb'):
+
+            return 'Error: _insert_notebook_cell only supports .ipynb files.'
+
+        if cell_type not in ('code', 'markdown'):
+
+            return f'Error: Unsupported cell type: {cell_type}. Use code or markdown.'
+
+        try:
+            notebook = AgenticGemini._load_notebook(absolute_path)
+
+        except Exception as e:
+
+            return f'Error reading notebook: {str(e)}'
+
+        if index < 0 or index > len(notebook.cells):
+
+            return f'Error: Cell index {index} out of range. The notebook has {len(notebook.cells)} cells.'
+
+        denial = AgenticGemini._request_approval(
+            f'INSERT a {cell_type} cell at index {index} of notebook: {absolute_path}',
+            [('edit', [absolute_path], len(source.encode('utf-8')))],
+        )
+
+        if denial:
+
+            return denial
+
+        try:
+            from nbformat.v4 import new_code_cell, new_markdown_cell
+
+            notebook.cells.insert(index, new_code_cell(source) if cell_type == 'code' else new_markdown_cell(source))
+            AgenticGemini._save_notebook(absolute_path, notebook)
+
+            return f'Successfully inserted cell {index} into {absolute_path}'
+
+        except Exception as e:
+
+            return f'Error writing file: {str(e)}'
+
+    @staticmethod
+    def _current_session_id() -> str:
+
+        return getattr(AgenticGemini._session, 'id', 'default')
+
+    @staticmethod
+    def _format_kernel_result(result: dict) -> str:
+
+        char_limit = 65536
+        content = result.get('output') or ''
+
+        if result.get('error'):
+            content += f'\n[ERROR]\n{result["error"]}'
+
+        if not content.strip():
+            content = 'Execution finished with no output.'
+
+        if len(content) > char_limit:
+            content = content[:char_limit] + f'\n\n[WARNING: Output truncated. Original size > {char_limit} characters.]'
+
+        return content
+
+    @staticmethod
+    def _run_python(code: Annotated[str, 'The Python code to execute in the persistent session kernel']) -> str:
+
+        try:
+            with phase('kernel_execute'):
+                result = get_kernel_pool().execute(AgenticGemini._current_session_id(), code, cwd=AgenticGemini._base_dir())
+
+        except Exception as e:
+
+            return f'Error executing code: {str(e)}'
+
+        return AgenticGemini._format_kernel_result(result)
+
+    @staticmethod
+    def _execute_cells(relative_path: Annotated[str, 'The relative path of the .ipynb file from /my_files'],
+                       start_index: Annotated[int, 'The first cell to execute (0-based)'],
+                       end_index: Annotated[int, 'The last cell to execute (inclusive). Defaults to the last cell'] = None) -> str:
+
+        absolute_path = AgenticGemini._get_absolute_path(relative_path)
+        error = AgenticGemini._check_notebook_path(absolute_path)
+
+        if error:
+
+            return error
+
+        try:
+            notebook = AgenticGemini._load_notebook(absolute_path)
+
+        except Exception as e:
+
+            return f'Error reading notebook: {str(e)}'
+
+        if end_index is None:
+            end_index = len(notebook.cells) - 1
+
+        if start_index < 0 or end_index < start_index or end_index >= len(notebook.cells):
+
+            return f'Error: Invalid cell range {start_index}-{end_index}. The notebook has {len(notebook.cells)} cells.'
+
+        pool = get_kernel_pool()
+        session_id = AgenticGemini._current_session_id()
+        content_parts = []
+
+        for index in range(start_index, end_index + 1):
+            cell = notebook.cells[index]
+
+            if cell.cell_type != 'code' or not cell.source.strip():
+                continue
+
+            try:
+                with phase('kernel_execute'):
+                    result = pool.execute(session_id, cell.source, filename=f'<cell {index}>', cwd=AgenticGemini._base_dir())
+
+            except Exception as e:
+
+                return f'Error executing cell {index}: {str(e)}'
+
+            content_parts.append(f'# --- OUTPUT {index} ---\n{AgenticGemini._format_kernel_result(result)}')
+
+            if result.get('error'):
+                content_parts.append(f'Stopped at cell {index} because it raised an error.')
+                break
+
+        if not content_parts:
+
+            return 'No code cells to execute in the given range.'
+
+        return AgenticGemini._format_kernel_result({'output': '\n\n'.join(content_parts)})
+
+    @staticmethod
+    def _create_file(relative_path: Annotated[str, 'The path of the new file']) -> str:
+
+        absolute_path = AgenticGemini._get_absolute_path(relative_path)
+        ext = os.path.splitext(absolute_path)[1]
+
+        if ext not in AgenticGemini._get_editable_extensions():
+
+            return f'Error: Cannot create file type {ext}. Only .py, .c, and .ipynb are supported for creation.'
+
+        if not absolute_path.startswith(AgenticGemini._base_dir()):
+
+            return 'Error: Path traversal detected. Access denied.'
+
+        if os.path.basename(absolute_path).startswith('.'):
+
+            return 'Error: Cannot create hidden files.'
+
+        denial = AgenticGemini._request_approval(
+            f'CREATE file: {absolute_path}',
+            [('create_file', [absolute_path], 0)],
+        )
+
+        if denial:
+
+            return denial
+
+        try:
+            os.makedirs(os.path.dirname(absolute_path), exist_ok=True)
+
+            # Exclusive create: never truncates an existing file, or the inode it shares with another path.
+            with open(absolute_path, 'x'):
+                pass
+
+            AgenticGemini._schedule_conversion(absolute_path)
+
+            return f'Successfully created file {absolute_path}'
+
+        except Exception as e:
+
+            return f'Error creating file: {str(e)}'
+
+    @staticmethod
+    def _create_directory(relative_path: Annotated[str, 'The directory path to create inside /my_files']) -> str:
+
+        absolute_path = AgenticGemini._get_absolute_path(relative_path)
+
+        if not absolute_path.startswith(AgenticGemini._base_dir()):
+
+            return 'Error: Path traversal detected. Access denied.'
+
+        if os.path.basename(absolute_path).startswith('.'):
+
+            return 'Error: Cannot create hidden directories.'
+
+        denial = AgenticGemini._request_approval(
+            f'CREATE directory: {absolute_path}',
+            [('create_directory', [absolute_path], 0)],
+        )
+
+        if denial:
+
+            return denial
+
+        try:
+            os.makedirs(absolute_path, exist_ok=True)
+
+            return f'Successfully created directory {absolute_path}'
+
+        except Exception as e:
+
+            return f'Error creating directory: {str(e)}'
+
+    @staticmethod
+    def _delete_item(relative_path: Annotated[str, 'The path to the file or directory to delete']) -> str:
+
+        absolute_path = AgenticGemini._get_absolute_path(relative_path)
+
+        if not absolute_path.startswith(AgenticGemini._base_dir()):
+
+            return 'Error: Path traversal detected. Access denied.'
+
+        if os.path.basename(absolute_path).startswith('.'):
+
+            return 'Error: Cannot delete hidden files or directories.'
+
+        if not os.path.exists(absolute_path):
 
             return f'Error: Path not found: {absolute_path}'
 
-        print(f'VERIFICATION REQUIRED: Agent wants to CUT to clipboard: {absolute_path}')
-        user_verification = input('Type "YES" to confirm: ')
+        denial = AgenticGemini._request_approval(
+            f'DELETE: {absolute_path}',
+            [('delete', [absolute_path], lambda: AgenticGemini._path_size(absolute_path))],
+        )
 
-        if user_verification != 'YES':
+        if denial:
 
-            return 'Error: User denied the operation.'
+            return denial
+
+        try:
+            if os.path.isdir(absolute_path):
+                shutil.rmtree(absolute_path)
+            else:
+                os.remove(absolute_path)
+
+            return f'Successfully deleted {absolute_path}'
+
+        except Exception as e:
+
+            return f'Error deleting item: {str(e)}'
+
+    @staticmethod
+    def _copy_file(relative_path: Annotated[str, 'The path to the file or directory to copy to clipboard']) -> str:
+
+        absolute_path = AgenticGemini._get_absolute_path(relative_path)
+
+        if not absolute_path.startswith(AgenticGemini._base_dir()):
+
+            return 'Error: Path traversal detected. Access denied.'
+
+        if os.path.basename(absolute_path).startswith('.'):
+
+            return 'Error: Cannot copy hidden files or directories.'
+
+        if not os.path.exists(absolute_path):
+
+            return f'Error: Path not found: {absolute_path}'
+
+        denial = AgenticGemini._request_approval(
+            f'COPY to clipboard: {absolute_path}',
+            [('clipboard_copy', [absolute_path], None)],
+        )
 
-        AgenticGemini._clipboard_src = absolute_path
-        AgenticGemini._clipboard_op = 'CUT'
+        if denial:
+
+            return denial
+
+        clipboard = AgenticGemini._clipboard()
+        clipboard['src'] = absolute_path
+        clipboard['op'] = 'COPY'
+
+        return f'Item copied to clipboard: {absolute_path}. Use paste_file to complete operation.'
+
+    @staticmethod
+    def _cut_file(relative_path: Annotated[str, 'The path to the file or directory to cut (move) to clipboard']) -> str:
+
+        absolute_path = AgenticGemini._get_absolute_path(relative_path)
+
+        if not absolute_path.startswith(AgenticGemini._base_dir()):
+
+            return 'Error: Path traversal detected. Access denied.'
+
+        if os.path.basename(absolute_path).startswith('.'):
+
+            return 'Error: Cannot cut hidden files or directories.'
+
+        if not os.path.exists(absolute_path):
+
+            return f'Error: Path not found: {absolute_path}'
+
+        denial = AgenticGemini._request_approval(
+            f'CUT to clipboard: {absolute_path}',
+            [('clipboard_cut', [absolute_path], None)],
+        )
+
+        if denial:
+
+            return denial
+
+        clipboard = AgenticGemini._clipboard()
+        clipboard['src'] = absolute_path
+        clipboard['op'] = 'CUT'
 
         return f'Item cut to clipboard: {absolute_path}. Use paste_file to complete operation.'
 
     @staticmethod
     def _paste_file(relative_destination_path: Annotated[str, 'The destination path to paste the clipboard item']) -> str:
 
-        if not AgenticGemini._clipboard_src or not AgenticGemini._clipboard_op:
+        clipboard = AgenticGemini._clipboard()
+
+        if not clipboard['src'] or not clipboard['op']:
 
             return 'Error: Clipboard is empty. Use copy_file or cut_file first.'
 
         dest_path = AgenticGemini._get_absolute_path(relative_destination_path)
 
-        if not dest_path.startswith('/my_files'):
+        if not dest_path.startswith(AgenticGemini._base_dir()):
 
             return 'Error: Path traversal detected. Access denied.'
 
@@ -581,34 +1705,41 @@ class AgenticGemini:
 
             return 'Error: Cannot paste to hidden files or directories.'
 
-        if not os.path.exists(AgenticGemini._clipboard_src):
-            AgenticGemini._clipboard_src = None
-            AgenticGemini._clipboard_op = None
+        if not os.path.exists(clipboard['src']):
+            clipboard['src'] = None
+            clipboard['op'] = None
 
             return 'Error: Source item no longer exists.'
 
-        print(f'VERIFICATION REQUIRED: Agent wants to PASTE ({AgenticGemini._clipboard_op}) from {AgenticGemini._clipboard_src} to {dest_path}')
-        user_verification = input('Type "YES" to confirm: ')
+        source_path = clipboard['src']
+        denial = AgenticGemini._request_approval(
+            f'PASTE ({clipboard["op"]}) from {source_path} to {dest_path}',
+            [('copy' if clipboard['op'] == 'COPY' else 'move', [source_path, dest_path], lambda: AgenticGemini._path_size(source_path))],
+        )
 
-        if user_verification != 'YES':
+        if denial:
 
-            return 'Error: User denied the operation.'
+            return denial
 
         try:
             os.makedirs(os.path.dirname(dest_path), exist_ok=True)
 
-            if AgenticGemini._clipboard_op == 'COPY':
-                if os.path.isdir(AgenticGemini._clipboard_src):
-                    shutil.copytree(AgenticGemini._clipboard_src, dest_path, dirs_exist_ok=True)
-                else:
-                    shutil.copy2(AgenticGemini._clipboard_src, dest_path)
+            if clipboard['op'] == 'COPY':
+                with phase('file_copy'):
+                    progress = fast_copy.copy_path(clipboard['src'], dest_path, progress_callback=AgenticGemini._copy_progress_reporter())
 
-                return f'Successfully copied to {dest_path}'
+                AgenticGemini._schedule_conversion(dest_path)
+                skipped = f' ({progress.files_skipped} unchanged files skipped)' if progress.files_skipped else ''
 
-            elif AgenticGemini._clipboard_op == 'CUT':
-                shutil.move(AgenticGemini._clipboard_src, dest_path)
-                AgenticGemini._clipboard_src = None
-                AgenticGemini._clipboard_op = None
+                return f'Successfully copied to {dest_path}: {progress.summary()}{skipped}'
+
+            elif clipboard['op'] == 'CUT':
+                with phase('file_copy'):
+                    fast_copy.move_path(clipboard['src'], dest_path, progress_callback=AgenticGemini._copy_progress_reporter())
+
+                AgenticGemini._schedule_conversion(dest_path)
+                clipboard['src'] = None
+                clipboard['op'] = None
 
                 return f'Successfully moved to {dest_path}'
 
@@ -618,136 +1749,388 @@ class AgenticGemini:
 
             return f'Error pasting item: {str(e)}'
 
+    @staticmethod
+    def _batch_operation_kinds() -> set:
+
+        return {'create_directory', 'create_file', 'delete', 'copy', 'move'}
+
+    @staticmethod
+    def _plan_batch_operations(operations: list) -> tuple:
+
+        planned = []
+        virtual = {}
+
+        def resolve(path: str):
+
+            # Where `path` will live once the operations planned so far have run: an on-disk path to inspect,
+            # 'dir' or 'file' for items the batch creates, or None if it will no longer exist.
+            probe = path
+
+            while True:
+                if probe in virtual:
+                    state = virtual[probe]
+
+                    if state is None:
+                        return None
+
+                    kind, origin = state
+
+                    if kind == 'alias':
+                        return os.path.normpath(os.path.join(origin, os.path.relpath(path, probe)))
+
+                    return origin if probe == path else path
+
+                parent = os.path.dirname(probe)
+
+                if parent == probe:
+                    return path
+
+                probe = parent
+
+        def exists(path: str) -> bool:
+
+            resolved = resolve(path)
+
+            return resolved in ('dir', 'file') or (resolved is not None and os.path.exists(resolved))
+
+        def is_dir(path: str) -> bool:
+
+            resolved = resolve(path)
+
+            return resolved == 'dir' or (resolved not in (None, 'dir', 'file') and os.path.isdir(resolved))
+
+        for number, operation in enumerate(operations, start=1):
+            kind = operation.get('op')
+            path = operation.get('path')
+
+            if kind not in AgenticGemini._batch_operation_kinds():
+
+                return None, f'Error: Operation {number}: unknown op {kind!r}. Supported: {sorted(AgenticGemini._batch_operation_kinds())}'
+
+            if not path:
+
+                return None, f'Error: Operation {number}: missing "path".'
+
+            absolute_path = AgenticGemini._get_absolute_path(path)
+
+            if not absolute_path.startswith(AgenticGemini._base_dir()):
+
+                return None, f'Error: Operation {number}: Path traversal detected. Access denied.'
+
+            if os.path.basename(absolute_path).startswith('.'):
+
+                return None, f'Error: Operation {number}: Hidden files and directories are not allowed.'
+
+            step = {'op': kind, 'path': absolute_path}
+
+            if kind == 'create_directory':
+                virtual[absolute_path] = ('new', 'dir')
+
+            elif kind == 'create_file':
+                if os.path.splitext(absolute_path)[1] not in AgenticGemini._get_editable_extensions():
+
+                    return None, f'Error: Operation {number}: Only .py, .c, and .ipynb files can be created.'
+
+                if exists(absolute_path):
+
+                    return None, f'Error: Operation {number}: File already exists: {absolute_path}'
+
+                virtual[absolute_path] = ('new', 'file')
+
+            elif kind == 'delete':
+                if not exists(absolute_path):
+
+                    return None, f'Error: Operation {number}: Path not found: {absolute_path}'
+
+                virtual[absolute_path] = None
+
+            else:
+                destination = operation.get('destination')
+
+                if not destination:
+
+                    return None, f'Error: Operation {number}: {kind} requires a "destination".'
+
+                destination_path = AgenticGemini._get_absolute_path(destination)
+
+                if not destination_path.startswith(AgenticGemini._base_dir()):
+
+                    return None, f'Error: Operation {number}: Path traversal detected. Access denied.'
+
+                if os.path.basename(destination_path).startswith('.'):
+
+                    return None, f'Error: Operation {number}: Hidden files and directories are not allowed.'
+
+                if not exists(absolute_path):
+
+                    return None, f'Error: Operation {number}: Path not found: {absolute_path}'
+
+                # Like cp/mv: an existing directory receives the item instead of being replaced by it.
+                if is_dir(destination_path):
+                    destination_path = os.path.join(destination_path, os.path.basename(absolute_path))
+
+                if destination_path == absolute_path or destination_path.startswith(absolute_path + os.sep):
+
+                    return None, f'Error: Operation {number}: Destination is inside the source.'
+
+                if exists(destination_path):
+                    if operation.get('overwrite') is not True:
+
+                        return None, f'Error: Operation {number}: Destination already exists: {destination_path}. Add "overwrite": true to replace it.'
+
+                    step['overwrite'] = True
+
+                step['destination'] = destination_path
+                source = resolve(absolute_path)
+                virtual[destination_path] = ('new', source) if source in ('dir', 'file') else ('alias', source)
+
+                if kind == 'move':
+                    virtual[absolute_path] = None
+
+            planned.append(step)
+
+        return planned, None
+
+    @staticmethod
+    def _stash_path(path: str, trash_dir: str, undo: list) -> None:
+
+        os.makedirs(trash_dir, exist_ok=True)
+        stash = os.path.join(trash_dir, str(len(undo)))
+        shutil.move(path, stash)
+        undo.append(lambda: shutil.move(stash, path))
+
+    @staticmethod
+    def _execute_batch_step(step: dict, trash_dir: str, undo: list) -> None:
+
+        path = step['path']
+
+        if step['op'] == 'create_directory':
+            missing = []
+            probe = path
+            while not os.path.exists(probe):
+                missing.append(probe)
+                probe = os.path.dirname(probe)
+
+            os.makedirs(path, exist_ok=True)
+            undo.extend(lambda d=d: os.rmdir(d) for d in missing)
+
+        elif step['op'] == 'create_file':
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+
+            with open(path, 'x'):
+                pass
+
+            undo.append(lambda: os.remove(path))
+
+        elif step['op'] == 'delete':
+            AgenticGemini._stash_path(path, trash_dir, undo)
+
+        else:
+            destination = step['destination']
+
+            if os.path.lexists(destination):
+                if not step.get('overwrite'):
+                    raise FileExistsError(f'Destination appeared after the batch was confirmed: {destination}')
+
+                AgenticGemini._stash_path(destination, trash_dir, undo)
+
+            os.makedirs(os.path.dirname(destination), exist_ok=True)
+
+            # Undo actions are registered before running so a half-finished copy or move is also reverted.
+            if step['op'] == 'copy':
+                undo.append(lambda: AgenticGemini._remove_path(destination))
+                fast_copy.copy_path(path, destination)
+            else:
+                undo.append(lambda: shutil.move(destination, path) if os.path.exists(destination) and not os.path.exists(path) else None)
+                fast_copy.move_path(path, destination)
+
+    @staticmethod
+    def _remove_path(path: str) -> None:
+
+        if os.path.isdir(path):
+            shutil.rmtree(path)
+        elif os.path.exists(path):
+            os.remove(path)
+
+    @staticmethod
+    def _discard_trash(trash_dir: str) -> None:
+
+        shutil.rmtree(trash_dir, ignore_errors=True)
+
+        try:
+            os.rmdir(os.path.dirname(trash_dir))
+        except OSError:
+            pass
+
+    @staticmethod
+    def _batch_file_operations(operations: Annotated[str, 'A JSON array of operations, run in order. Each is an object with "op" (create_directory, create_file, delete, copy or move), "path" (relative to /my_files) and, for copy/move, "destination" (an existing directory receives the item) plus optional "overwrite": true to replace an existing destination']) -> str:
+
+        try:
+            operations = json.loads(operations)
+
+        except json.JSONDecodeError as e:
+
+            return f'Error: operations must be a JSON array: {str(e)}'
+
+        if not isinstance(operations, list) or not all(isinstance(operation, dict) for operation in operations):
+
+            return 'Error: operations must be a JSON array of objects.'
+
+        if not operations:
+
+            return 'Error: No operations given.'
+
+        planned, error = AgenticGemini._plan_batch_operations(operations)
+
+        if error:
+
+            return error
+
+        checks = []
+        listing = []
+
+        for number, step in enumerate(planned, start=1):
+            paths = [step['path'], step['destination']] if 'destination' in step else [step['path']]
+            size = (lambda path=step['path']: AgenticGemini._path_size(path)) if step['op'] in ('delete', 'copy', 'move') else 0
+            checks.append((step['op'], paths, size))
+            replaces = ' (REPLACES the existing destination)' if step.get('overwrite') else ''
+            listing.append(f'  {number}. {step["op"].upper()} {" -> ".join(paths)}{replaces}')
+
+        denial = AgenticGemini._request_approval(
+            f'run a BATCH of {len(planned)} file operations:',
+            checks,
+            details='\n'.join(listing),
+        )
+
+        if denial:
+
+            return denial
+
+        trash_dir = os.path.join(AgenticGemini._base_dir(), '.agentic_trash', uuid.uuid4().hex)
+        undo = []
+
+        for number, step in enumerate(planned, start=1):
+            try:
+                with phase('batch_file_operation'):
+                    AgenticGemini._execute_batch_step(step, trash_dir, undo)
+
+            except Exception as e:
+                rollback_errors = []
+
+                for action in reversed(undo):
+                    try:
+                        action()
+                    except Exception as rollback_error:
+                        rollback_errors.append(str(rollback_error))
+
+                AgenticGemini._discard_trash(trash_dir)
+                status = 'All previous operations were rolled back.' if not rollback_errors else f'Rollback was incomplete: {"; ".join(rollback_errors)}'
+
+                return f'Error: Operation {number} ({step["op"]} {step["path"]}) failed: {str(e)}. {status}'
+
+        AgenticGemini._discard_trash(trash_dir)
+
+        for step in planned:
+            if step['op'] in ('create_file', 'copy', 'move'):
+                AgenticGemini._schedule_conversion(step.get('destination', step['path']))
+
+        return f'Successfully executed {len(planned)} operations.'
+
+    @staticmethod
+    def _copy_progress_reporter():
+
+        # Resolved here, in the session's own thread; the returned callback runs on fast_copy's worker threads.
+        handler = getattr(AgenticGemini._session, 'progress_handler', None) or print
+
+        def report(progress) -> None:
+
+            handler(f'Paste in progress: {progress.summary()}')
+
+        return report
+
     def run_tool_use_chat(self):
 
+        from autogen import ConversableAgent, UserProxyAgent
+
         self.logger.info('Running: Tool Use Chat (Find, Read, Edit, Run Files)')
 
-        prompt = input(
+        self._begin_run()
+        prompt = self.recorder.ask_prompt(
             'Enter your prompt (e.g., "Find main.c, read it, and then run it"): '
         )
 
-        system_message = (
-            'You are an assistant that uses tools. You can interact with text-based files (e.g., .py, .c, .ipynb, .txt, .md, .json, .csv, .html, .css, .js) and document files (.pdf, .docx).\n'
-            'You have 9 tools: `_find_file_path`, `_read_file_content`, `_write_file_content`, `_create_file`, `_create_directory`, `_delete_item`, `_copy_file`, `_cut_file`, `_paste_file`.\n'
-            'All file tools operate on the `/my_files` directory.\n'
-            'Dangerous operations (Write, Create, Delete, Copy, Cut, Paste) will prompt the user for manual verification. If denied, handle the error gracefully.\n'
-            '`_find_file_path` returns relative paths. Hidden files are ignored. It automatically searches for casing/separator variations.\n'
-            '`_read_file_content` has a limit of ~8k tokens. Larger files are truncated.\n'
-            'For PDF files, you can read a specific chapter by providing the `chapter` argument (matches bookmarks).\n'
-            '`_delete_item` permanently removes files or directories. Hidden files cannot be deleted.\n'
-            'To move or copy files, use the clipboard: `_copy_file`/`_cut_file` -> `_paste_file`.\n'
-            'To *run* a file, you do not have a tool. Instead, you must **reply with a shell code block** (starting with ```sh) for the executor to run.\n'
-            '**CRITICAL: You must act as the user for any interactive script.**\n'
-            'If a script requires input, pipe it using `printf` or `echo`.\n'
-            '**You can execute .py, .c, and .ipynb files.**\n'
-            '**You must not call a tool named "run_code".**\n'
-            '**Do NOT use shell commands for file manipulation (rm, mkdir, touch, cp, mv). Use the provided tools.**\n'
-            'For `.ipynb` files, the `content` argument in `_write_file_content` must be the **raw content string**, NOT a JSON object.\n'
-            'To create multiple cells in a notebook, you MUST separate them with these specific delimiters:\n'
-            'For Code Cells: `# --- CELL: CODE ---`\n'
-            'For Markdown Cells: `# --- CELL: MARKDOWN ---`\n'
-            'Example:\n'
-            '`# --- CELL: MARKDOWN ---\n# Analysis\nHere is the analysis.\n# --- CELL: CODE ---\nprint("Hello")`\n'
-            'The script will be executed with `/my_files` as the working directory, so use relative paths.\n'
-            'When the operation is successful and the task is done, reply with TERMINATE.'
-        )
+        AgenticGemini._session.id = self.session_id
+        AgenticGemini._session.progress_handler = self.progress_handler
+        AgenticGemini._session.clipboard = self.recorder.state['clipboard'] or {'src': None, 'op': None}
+        AgenticGemini._session.workspace = get_workspace_manager().open(self.session_id, resume=self.recorder.resumed) if self.session_workspaces else None
+        self.recorder.clipboard_source = AgenticGemini._clipboard
+
+        registry = AgenticGemini._tool_registry()
+        tool_names = registry.resolve(self.enabled_tools)
 
         tool_agent = ConversableAgent(
             name='tool_agent',
-            system_message=system_message,
-            llm_config=self.llm_config,
+            system_message=registry.system_message(tool_names),
+            llm_config=registry.llm_config(self.llm_config, tool_names),
         )
 
         executor_agent = UserProxyAgent(
             name='executor_agent',
             human_input_mode='NEVER',
             llm_config=self.llm_config,
-            code_execution_config={'work_dir': '/my_files', 'use_docker': False},
+            code_execution_config={'work_dir': AgenticGemini._base_dir(), 'use_docker': False},
             is_termination_msg=lambda x: 'TERMINATE' in (x.get('content', '') or '').upper()
         )
 
-        register_function(
-            self._find_file_path,
-            caller=tool_agent,
-            executor=executor_agent,
-            description='Find the relative path(s) of files matching the name/pattern in /my_files. Supports automatic fuzzy matching for separators and casing.',
-        )
-
-        register_function(
-            self._read_file_content,
-            caller=tool_agent,
-            executor=executor_agent,
-            description='Read the content of a file. Supports .py, .c, .ipynb, .txt, .md, .json, .csv, .pdf, .docx, etc. Content truncated at ~8k tokens. Can read specific PDF chapters.',
-        )
-
-        register_function(
-            self._write_file_content,
-            caller=tool_agent,
-            executor=executor_agent,
-            description='Write (or overwrite) content to a file (.py, .c, or .ipynb), given its relative path from /my_files',
-        )
-
-        register_function(
-            self._create_file,
-            caller=tool_agent,
-            executor=executor_agent,
-            description='Create a new empty file (.py, .c, or .ipynb), given its relative path from /my_files',
-        )
-
-        register_function(
-            self._create_directory,
-            caller=tool_agent,
-            executor=executor_agent,
-            description='Create a new directory, given its relative path from /my_files',
-        )
-
-        register_function(
-            self._delete_item,
-            caller=tool_agent,
-            executor=executor_agent,
-            description='Permanently delete a file or directory, given its relative path from /my_files',
-        )
+        registry.attach_executor(executor_agent, tool_names)
 
-        register_function(
-            self._copy_file,
-            caller=tool_agent,
-            executor=executor_agent,
-            description='Copy a file/directory to the clipboard.',
-        )
+        try:
+            chat_result = executor_agent.initiate_chat(
+                recipient=tool_agent,
+                **self._pair_chat_kwargs(executor_agent, tool_agent, prompt, self.max_calls)
+            )
 
-        register_function(
-            self._cut_file,
-            caller=tool_agent,
-            executor=executor_agent,
-            description='Cut (move) a file/directory to the clipboard.',
-        )
+        finally:
+            pool = existing_kernel_pool()
 
-        register_function(
-            self._paste_file,
-            caller=tool_agent,
-            executor=executor_agent,
-            description='Paste the item currently in the clipboard to a new destination.',
-        )
+            if pool is not None:
+                pool.release(self.session_id)
 
-        chat_result = executor_agent.initiate_chat(
-            recipient=tool_agent,
-            message=prompt,
-            max_turns=self.max_calls,
-        )
+            AgenticGemini.approval_policy.clear_session(self.session_id)
+            self.recorder.clipboard_source = None
+            AgenticGemini._session.clipboard = None
+            AgenticGemini._session.progress_handler = None
+            self._close_workspace()
 
         self.logger.info('Final output:\n%s', chat_result.chat_history[-1]['content'])
 
+        return chat_result.chat_history[-1]['content']
+
 
 if __name__ == '__main__':
     CONFIG_PATH = 'config_path.json'
     MAX_CALLS = 10
+    PROFILE = '--profile' in sys.argv
+    PROFILE_DIR = 'profiles'
 
     try:
         with open(CONFIG_PATH, 'r') as f:
             app_config = json.load(f)
 
         config_list_path = app_config['config_path']
-        gemini = AgenticGemini(config_path=config_list_path, max_calls=MAX_CALLS)
+        gemini = AgenticGemini(
+            config_path=config_list_path,
+            max_calls=MAX_CALLS,
+            approval_policy_path=app_config.get('approval_policy_path'),
+            history_token_budget=app_config.get('history_token_budget', 6000),
+            speaker_selection=app_config.get('speaker_selection', 'auto'),
+            max_parallel_workers=app_config.get('max_parallel_workers', 4),
+            max_subtasks=app_config.get('max_subtasks', 8),
+            session_workspaces=app_config.get('session_workspaces', False),
+            workspace_on_exit=app_config.get('workspace_on_exit', 'ask'),
+            model_client=app_config.get('model_client'),
+            enabled_tools=app_config.get('enabled_tools'),
+        )
 
     except Exception as e:
         print(f'Failed to initialize. Ensure "{CONFIG_PATH}" exists and is valid,')
@@ -762,28 +2145,44 @@ if __name__ == '__main__':
         print('3. Orchestrated Group Chat (Manager, Planner, Reviewer)')
         print('4. Group Chat with Human-in-the-Loop (Expert, Planner, Reviewer, Human)')
         print('5. Tool Use Chat (Find, Read, Edit, Run, Create, Delete, Copy/Cut/Paste)')
-        print('6. Exit')
+        print('6. Parallel Fan-Out (Coordinator, Workers, Merger)')
+        print('7. Exit')
+
+        choice = input('Enter your choice (1-7): ')
+        profiler = None
 
-        choice = input('Enter your choice (1-6): ')
+        if PROFILE and choice in {'1', '2', '3', '4', '5', '6'}:
+            profiler = RunProfiler(f'Mode {choice}')
+            profiler.start()
 
-        if choice == '1':
-            gemini.run_basic_code_agent()
+        try:
+            if choice == '1':
+                gemini.run_basic_code_agent()
 
-        elif choice == '2':
-            gemini.run_coder_reviewer_chat()
+            elif choice == '2':
+                gemini.run_coder_reviewer_chat()
 
-        elif choice == '3':
-            gemini.run_group_chat_auto()
+            elif choice == '3':
+                gemini.run_group_chat_auto()
 
-        elif choice == '4':
-            gemini.run_human_in_the_loop_chat()
+            elif choice == '4':
+                gemini.run_human_in_the_loop_chat()
 
-        elif choice == '5':
-            gemini.run_tool_use_chat()
+            elif choice == '5':
+                gemini.run_tool_use_chat()
 
-        elif choice == '6':
-            print('Exiting...')
-            break
+            elif choice == '6':
+                gemini.run_parallel_fanout_chat()
 
-        else:
-            print('Invalid choice. Please select a number between 1 and 6.')
\ No newline at end of file
+            elif choice == '7':
+                print('Exiting...')
+                break
+
+            else:
+                print('Invalid choice. Please select a number between 1 and 7.')
+
+        finally:
+            # Stopped even when the mode fails, so the next profiled run can start.
+            if profiler:
+                profiler.stop()
+                print(f'Profile saved to: {profiler.save(PROFILE_DIR)}')
\ No newline at end of file
@@ -0,0 +1,269 @@
+import functools
+import json
+import logging
+import random
+import re
+import threading
+import time
+
+
+RETRY_DELAY = re.compile(r'retryDelay[\'"]?\s*:\s*[\'"]?(\d+(?:\.\d+)?)s')
+CHARS_PER_TOKEN = 4
+
+
+class TokenBucket:
+
+    def __init__(self, per_minute: float):
+
+        self.capacity = float(per_minute)
+        self.rate = self.capacity / 60.0
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._condition = threading.Condition()
+
+    def _refill(self) -> None:
+
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self, amount: float = 1.0) -> float:
+
+        # Requests larger than the whole bucket would wait forever; they get the full bucket instead.
+        amount = min(float(amount), self.capacity)
+        waited = 0.0
+
+        with self._condition:
+            while True:
+                self._refill()
+
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return waited
+
+                delay = (amount - self.tokens) / self.rate
+                self._condition.wait(delay)
+                waited += delay
+
+    def adjust(self, amount: float) -> None:
+
+        # Settles an estimate against the real usage; a negative balance makes later callers wait.
+        with self._condition:
+            self._refill()
+            self.tokens = min(self.capacity, self.tokens - amount)
+            self._condition.notify_all()
+
+
+class ModelClientLayer:
+
+    def __init__(self, rate_limits: dict = None, max_retries: int = 5, backoff_base: float = 1.0, backoff_max: float = 60.0):
+
+        self.rate_limits = rate_limits or {}
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.logger = logging.getLogger(__name__)
+        self.stats = {'requests': 0, 'retries': 0, 'rate_limited': 0, 'failovers': 0, 'throttle_seconds': 0.0}
+        self._buckets = {}
+        self._clients = {}
+        self._lock = threading.Lock()
+
+    def configure(self, rate_limits: dict = None, max_retries: int = None, backoff_base: float = None,
+                  backoff_max: float = None) -> None:
+
+        with self._lock:
+            # Every session re-applies the same settings; the shared buckets (and the quota they have used) must survive that.
+            if rate_limits is not None and rate_limits != self.rate_limits:
+                self.rate_limits = rate_limits
+                self._buckets.clear()
+            if max_retries is not None:
+                self.max_retries = max_retries
+            if backoff_base is not None:
+                self.backoff_base = backoff_base
+            if backoff_max is not None:
+                self.backoff_max = backoff_max
+
+    def _limits_for(self, model: str) -> dict:
+
+        return self.rate_limits.get(model) or self.rate_limits.get('default') or {}
+
+    def buckets(self, api_key: str, model: str) -> tuple:
+
+        # One pair of buckets per key and model, shared by every session in the process.
+        key = (api_key, model)
+
+        with self._lock:
+            if key not in self._buckets:
+                limits = self._limits_for(model)
+                rpm = limits.get('requests_per_minute')
+                tpm = limits.get('tokens_per_minute')
+                self._buckets[key] = (TokenBucket(rpm) if rpm else None, TokenBucket(tpm) if tpm else None)
+
+            return self._buckets[key]
+
+    def pooled_client(self, genai_client_cls, api_key: str = None, http_options=None, **kwargs):
+
+        options = http_options.model_dump_json(exclude_none=True) if hasattr(http_options, 'model_dump_json') else repr(http_options)
+        key = (api_key, options, json.dumps(kwargs, sort_keys=True, default=repr))
+
+        with self._lock:
+            client = self._clients.get(key)
+
+            if client is None:
+                # genai.Client owns an httpx connection pool; reusing it keeps TLS connections alive across calls.
+                client = self._clients[key] = genai_client_cls(api_key=api_key, http_options=http_options, **kwargs)
+
+            return client
+
+    @staticmethod
+    def estimate_tokens(params: dict) -> int:
+
+        chars = 0
+
+        for message in params.get('messages', []):
+            content = message.get('content')
+
+            if isinstance(content, str):
+                chars += len(content)
+            elif isinstance(content, list):
+                chars += sum(len(part.get('text', '')) for part in content if isinstance(part, dict))
+
+        return max(1, chars // CHARS_PER_TOKEN)
+
+    @staticmethod
+    def classify(error: Exception) -> str:
+
+        code = getattr(error, 'code', None)
+        name = type(error).__name__
+
+        if code == 429 or name in ('ResourceExhausted', 'TooManyRequests'):
+            return 'rate_limit'
+
+        if isinstance(code, int) and code >= 500 or name in ('ServerError', 'InternalServerError', 'ServiceUnavailable'):
+            return 'server'
+
+        if name in ('ConnectError', 'ReadTimeout', 'WriteTimeout', 'PoolTimeout', 'RemoteProtocolError', 'ReadError',
+                    'ConnectTimeout', 'TimeoutException', 'ConnectionError'):
+            return 'connection'
+
+        return 'fatal'
+
+    def backoff(self, attempt: int, error: Exception) -> float:
+
+        match = RETRY_DELAY.search(str(error))
+
+        if match:
+            # The API said exactly when quota frees up; add a little jitter so waiting sessions do not stampede.
+            return float(match.group(1)) + random.uniform(0, 1)
+
+        # Full jitter: uniform in [0, base * 2^attempt], capped.
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    def call(self, create, client, params: dict):
+
+        model = params.get('model') or getattr(client, 'model', '')
+        request_bucket, token_bucket = self.buckets(getattr(client, 'api_key', None), model)
+        estimate = self.estimate_tokens(params)
+        attempt = 0
+
+        while True:
+            throttled = 0.0
+
+            if request_bucket:
+                throttled += request_bucket.acquire(1)
+            if token_bucket:
+                throttled += token_bucket.acquire(estimate)
+
+            self.stats['throttle_seconds'] += throttled
+            self.stats['requests'] += 1
+
+            try:
+                response = create(client, params)
+
+            except Exception as e:
+                kind = self.classify(e)
+
+                if token_bucket:
+                    # Nothing was generated; give the estimate back.
+                    token_bucket.adjust(-estimate)
+
+                if kind == 'fatal':
+                    raise
+
+                if kind == 'rate_limit':
+                    self.stats['rate_limited'] += 1
+
+                if attempt >= self.max_retries:
+                    self.stats['failovers'] += 1
+                    raise self._failover_error(kind, e) from e
+
+                delay = self.backoff(attempt, e)
+                attempt += 1
+                self.stats['retries'] += 1
+                self.logger.warning('Gemini %s error (%s); retry %d/%d in %.1fs', kind, type(e).__name__, attempt, self.max_retries, delay)
+                time.sleep(delay)
+                continue
+
+            usage = getattr(response, 'usage', None)
+
+            if token_bucket and usage is not None:
+                actual = (getattr(usage, 'prompt_tokens', 0) or 0) + (getattr(usage, 'completion_tokens', 0) or 0)
+                token_bucket.adjust(actual - estimate)
+
+            return response
+
+    @staticmethod
+    def _failover_error(kind: str, error: Exception) -> Exception:
+
+        # OpenAIWrapper moves on to the next config_list entry only for these exception types.
+        from autogen.oai.client import gemini_InternalServerError, gemini_ResourceExhausted
+
+        if kind == 'rate_limit':
+            return gemini_ResourceExhausted(f'Rate limited after retries: {error}')
+
+        return gemini_InternalServerError(f'Gemini unavailable after retries: {error}')
+
+
+_layer = None
+_layer_lock = threading.Lock()
+
+
+class _PooledGenai:
+
+    def __init__(self, genai_module, layer: ModelClientLayer):
+
+        self._genai = genai_module
+        self.Client = functools.partial(layer.pooled_client, genai_module.Client)
+
+    def __getattr__(self, name: str):
+
+        return getattr(self._genai, name)
+
+
+def install_model_client(**settings) -> ModelClientLayer:
+
+    global _layer
+
+    with _layer_lock:
+        if _layer is not None:
+            _layer.configure(**settings)
+            return _layer
+
+        from autogen.oai import gemini
+
+        layer = ModelClientLayer(**settings)
+        original_create = gemini.GeminiClient.create
+
+        @functools.wraps(original_create)
+        def create(self, params: dict):
+
+            return layer.call(original_create, self, params)
+
+        gemini.GeminiClient.create = create
+
+        if hasattr(gemini, 'genai'):
+            gemini.genai = _PooledGenai(gemini.genai, layer)
+
+        _layer = layer
+
+        return layer
@@ -0,0 +1,229 @@
+import cProfile
+import contextlib
+import io
+import marshal
+import os
+import pstats
+import re
+import sys
+import threading
+import time
+
+
+# From Python 3.12 cProfile is built on sys.monitoring: one enabled Profile sees every thread,
+# and enabling a second one in the same process raises ValueError.
+MONITORING_PROFILER = sys.version_info >= (3, 12)
+
+# One run is profiled per process at a time, so phases and stats never mix runs.
+# Sessions that need profiling concurrently run in separate processes (session_worker.py).
+_active_profiler = None
+_active_lock = threading.Lock()
+
+
+class RunProfiler:
+
+    def __init__(self, label: str, top_n: int = 40):
+
+        self.label = label
+        self.top_n = top_n
+        self.phases = {}
+        self._phases_lock = threading.Lock()
+        self._thread_state = threading.local()
+        self._profiles = []
+        self._profiles_lock = threading.Lock()
+        self._wall_start = None
+        self._cpu_start = None
+        self.wall_time = 0.0
+        self.cpu_time = 0.0
+        self.profile_error = None
+
+    def start(self) -> None:
+
+        global _active_profiler
+
+        with _active_lock:
+            if _active_profiler is not None:
+                raise RuntimeError(f'{_active_profiler.label} is already being profiled in this process')
+
+            _active_profiler = self
+
+        self._wall_start = time.perf_counter()
+        self._cpu_start = time.process_time()
+
+        if not MONITORING_PROFILER:
+            threading.setprofile(self._attach_to_new_thread)
+
+        self._enable_for_current_thread()
+
+    def stop(self) -> None:
+
+        global _active_profiler
+
+        if self._wall_start is None:
+            return
+
+        if not MONITORING_PROFILER:
+            threading.setprofile(None)
+
+        with self._profiles_lock:
+            for profile in self._profiles:
+                profile.disable()
+
+        self.wall_time = time.perf_counter() - self._wall_start
+        self.cpu_time = time.process_time() - self._cpu_start
+
+        with _active_lock:
+            if _active_profiler is self:
+                _active_profiler = None
+
+    def _enable_for_current_thread(self) -> None:
+
+        profile = cProfile.Profile()
+
+        try:
+            profile.enable()
+        except ValueError as e:
+            # Another tool (a debugger, coverage) owns sys.monitoring; keep the phase timings without call stats.
+            self.profile_error = str(e)
+            return
+
+        with self._profiles_lock:
+            self._profiles.append(profile)
+
+    def _attach_to_new_thread(self, frame, event, arg) -> None:
+
+        # Before 3.12 only: runs once as the first profile event of every thread started while profiling;
+        # enabling cProfile here replaces this hook for that thread.
+        self._enable_for_current_thread()
+
+    @contextlib.contextmanager
+    def phase(self, name: str):
+
+        stack = getattr(self._thread_state, 'stack', None)
+
+        if stack is None:
+            stack = []
+            self._thread_state.stack = stack
+
+        frame = {'wall': time.perf_counter(), 'cpu': time.thread_time(), 'child_wall': 0.0, 'child_cpu': 0.0}
+        stack.append(frame)
+
+        try:
+            yield
+
+        finally:
+            stack.pop()
+            wall = time.perf_counter() - frame['wall']
+            cpu = time.thread_time() - frame['cpu']
+
+            if stack:
+                stack[-1]['child_wall'] += wall
+                stack[-1]['child_cpu'] += cpu
+
+            with self._phases_lock:
+                entry = self.phases.setdefault(name, {'calls': 0, 'wall': 0.0, 'cpu': 0.0})
+                entry['calls'] += 1
+                entry['wall'] += wall - frame['child_wall']
+                entry['cpu'] += cpu - frame['child_cpu']
+
+    def _stats(self):
+
+        stats = None
+
+        with self._profiles_lock:
+            profiles = list(self._profiles)
+
+        for profile in profiles:
+            try:
+                if stats is None:
+                    stats = pstats.Stats(profile)
+                else:
+                    stats.add(profile)
+            except TypeError:
+                # A Profile that never recorded a call has no stats to load.
+                continue
+
+        return stats
+
+    def stats_bytes(self) -> bytes:
+
+        stats = self._stats()
+
+        if stats is None:
+            return b''
+
+        return marshal.dumps(stats.stats)
+
+    def _model_call_time(self, stats) -> float:
+
+        total = 0.0
+
+        for (filename, _, funcname), (_, _, _, cumulative, _) in stats.stats.items():
+            if filename.replace('\\', '/').endswith('autogen/oai/gemini.py') and funcname == 'create':
+                total += cumulative
+
+        return total
+
+    def report(self) -> str:
+
+        lines = [
+            f'Profile: {self.label}',
+            f'Wall time: {self.wall_time:.3f}s',
+            f'CPU time (process): {self.cpu_time:.3f}s',
+            '',
+            'Phases (exclusive of nested phases):',
+            f'{"phase":<24}{"calls":>8}{"wall (s)":>12}{"cpu (s)":>12}{"wall %":>9}',
+        ]
+
+        if self.profile_error:
+            lines.insert(3, f'Call stats unavailable: {self.profile_error}')
+
+        with self._phases_lock:
+            phases = {name: dict(entry) for name, entry in self.phases.items()}
+
+        accounted = 0.0
+
+        for name, entry in sorted(phases.items(), key=lambda item: item[1]['wall'], reverse=True):
+            accounted += entry['wall']
+            share = 100.0 * entry['wall'] / self.wall_time if self.wall_time else 0.0
+            lines.append(f'{name:<24}{entry["calls"]:>8}{entry["wall"]:>12.3f}{entry["cpu"]:>12.3f}{share:>8.1f}%')
+
+        lines.append(f'{"(outside phases)":<24}{"":>8}{max(self.wall_time - accounted, 0.0):>12.3f}')
+
+        stats = self._stats()
+
+        if stats is not None:
+            lines.append('')
+            lines.append(f'Gemini client time (cumulative, from profile): {self._model_call_time(stats):.3f}s')
+            lines.append('')
+
+            buffer = io.StringIO()
+            stats.stream = buffer
+            stats.sort_stats('cumulative').print_stats(self.top_n)
+            lines.append(buffer.getvalue())
+
+        return '\n'.join(lines)
+
+    def save(self, directory: str) -> str:
+
+        os.makedirs(directory, exist_ok=True)
+        stem = os.path.join(directory, f'{time.strftime("%Y%m%d-%H%M%S")}_{re.sub(r"[^A-Za-z0-9]+", "_", self.label).strip("_")}')
+
+        with open(f'{stem}.txt', 'w', encoding='utf-8') as f:
+            f.write(self.report())
+
+        with open(f'{stem}.prof', 'wb') as f:
+            f.write(self.stats_bytes())
+
+        return f'{stem}.txt'
+
+
+def phase(name: str):
+
+    profiler = _active_profiler
+
+    if profiler is None:
+        return contextlib.nullcontext()
+
+    return profiler.phase(name)
+
@@ -0,0 +1,135 @@
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import socket
+import sys
+import threading
+import time
+from datetime import datetime, timedelta
+import web_app
+from web_app import SessionCheckpoint, SessionJob, app, db, run_agent_mode
+from main import prewarm_imports
+
+
+POLL_SECONDS = 0.5
+HEARTBEAT_SECONDS = 10
+STALE_SECONDS = 60
+
+
+def claim_job(worker_id: str):
+
+    with app.app_context():
+        job = SessionJob.query.filter_by(status='queued').order_by(SessionJob.id).first()
+
+        if job is None:
+            return None
+
+        # The conditional update makes the claim atomic, so two workers never run the same session (SQLite and PostgreSQL alike).
+        claimed = SessionJob.query.filter_by(id=job.id, status='queued').update({
+            'status': 'claimed',
+            'worker': worker_id,
+            'heartbeat': datetime.utcnow()
+        })
+        db.session.commit()
+
+        if not claimed:
+            return None
+
+        return {
+            'id': job.id,
+            'session_id': job.session_id,
+            'mode': job.mode,
+            'profile': bool(job.profile),
+            'resume_state': json.loads(job.resume_state) if job.resume_state else None,
+        }
+
+
+def set_job_status(job_id: int, status: str) -> None:
+
+    with app.app_context():
+        SessionJob.query.filter_by(id=job_id).update({'status': status, 'heartbeat': datetime.utcnow()})
+        db.session.commit()
+
+
+def send_heartbeats(job_id: int, stop: threading.Event) -> None:
+
+    while not stop.wait(HEARTBEAT_SECONDS):
+        with app.app_context():
+            SessionJob.query.filter_by(id=job_id).update({'heartbeat': datetime.utcnow()})
+            db.session.commit()
+
+
+def reap_stale_jobs() -> None:
+
+    # A worker that stopped sending heartbeats died mid-session; its session becomes resumable from the last checkpoint.
+    cutoff = datetime.utcnow() - timedelta(seconds=STALE_SECONDS)
+
+    with app.app_context():
+        stale = SessionJob.query.filter(SessionJob.status == 'claimed', SessionJob.heartbeat < cutoff).all()
+
+        for job in stale:
+            job.status = 'failed'
+            SessionCheckpoint.query.filter_by(session_id=job.session_id, status='running').update({'status': 'interrupted'})
+
+        db.session.commit()
+
+
+def work_loop(prewarm: bool = False) -> None:
+
+    logging.basicConfig(level=logging.INFO)
+    worker_id = f'{socket.gethostname()}:{os.getpid()}'
+    logger = logging.getLogger(__name__)
+    # Replies typed in the browser reach whichever web process the user is connected to, so they come via the database.
+    web_app.web_io.input_source = web_app._stored_input
+
+    if prewarm:
+        prewarm_imports()
+
+    logger.info('Worker %s waiting for sessions', worker_id)
+
+    # One session at a time per process: a session owns this process's stdout and input while it runs.
+    while True:
+        job = claim_job(worker_id)
+
+        if job is None:
+            reap_stale_jobs()
+            time.sleep(POLL_SECONDS)
+            continue
+
+        logger.info('Worker %s running session %s (mode %s)', worker_id, job['session_id'], job['mode'])
+        stop = threading.Event()
+        threading.Thread(target=send_heartbeats, args=(job['id'], stop), daemon=True).start()
+
+        try:
+            run_agent_mode(job['session_id'], job['mode'], job['profile'], job['resume_state'])
+        finally:
+            stop.set()
+            set_job_status(job['id'], 'done')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Run agent sessions queued by web_app.py --external-workers.')
+    parser.add_argument('--processes', type=int, default=1, help='Worker processes to start; each runs one session at a time')
+    parser.add_argument('--prewarm', action='store_true', help='Import the agent stack before taking the first session')
+    args = parser.parse_args()
+
+    if not os.environ.get('SOCKETIO_MESSAGE_QUEUE'):
+        sys.exit('SOCKETIO_MESSAGE_QUEUE must point at the same message queue as the web processes (e.g. redis://localhost:6379/0).')
+
+    with app.app_context():
+        db.create_all()
+
+    if args.processes <= 1:
+        work_loop(args.prewarm)
+    else:
+        # Spawned, not forked, so no process inherits another's database connections.
+        context = multiprocessing.get_context('spawn')
+        processes = [context.Process(target=work_loop, args=(args.prewarm,)) for _ in range(args.processes)]
+
+        for process in processes:
+            process.start()
+
+        for process in processes:
+            process.join()
@@ -7,8 +7,10 @@ const statusIndicator = document.getElementById('status-indicator');
 const backBtn = document.getElementById('back-btn');
 const historyList = document.getElementById('history-list');
 const sidebar = document.getElementById('history-sidebar');
+const profileToggle = document.getElementById('profile-toggle');
 
 let isWaitingForInput = false;
+let currentSessionId = null;
 let currentInputPrompt = '>';
 
 // Initial Load
@@ -25,6 +27,14 @@ marked.setOptions({
 
 socket.on('connect', () => {
     statusIndicator.textContent = 'Online';
+    // Output is sent to the session's room; rejoin it after a reconnect.
+    if (currentSessionId) {
+        socket.emit('join_session', { session_id: currentSessionId });
+    }
+});
+
+socket.on('session_started', (data) => {
+    currentSessionId = data.session_id;
 });
 
 socket.on('disconnect', () => {
@@ -35,6 +45,10 @@ socket.on('server_output', (msg) => {
     appendMessage(msg.data, 'agent');
 });
 
+socket.on('tool_progress', (msg) => {
+    statusIndicator.textContent = msg.data;
+});
+
 socket.on('request_input', (data) => {
     isWaitingForInput = true;
     currentInputPrompt = data.prompt || '>';
@@ -46,6 +60,7 @@ socket.on('request_input', (data) => {
 
 socket.on('session_ended', () => {
     isWaitingForInput = false;
+    currentSessionId = null;
     inputContainer.classList.add('hidden');
     statusIndicator.textContent = 'Finished';
     backBtn.classList.remove('hidden');
@@ -79,7 +94,7 @@ function selectMode(mode) {
     menuOverlay.classList.remove('active');
     backBtn.classList.add('hidden');
     outputArea.innerHTML = ''; 
-    socket.emit('start_mode', { mode: mode });
+    socket.emit('start_mode', { mode: mode, profile: profileToggle.checked });
     statusIndicator.textContent = 'Running Mode ' + mode;
 }
 
@@ -97,7 +112,7 @@ function sendInput() {
     
     appendMessage(currentInputPrompt + ' ' + text, 'user');
     
-    socket.emit('user_input', { message: text });
+    socket.emit('user_input', { session_id: currentSessionId, message: text });
     
     inputField.value = '';
     inputContainer.classList.add('hidden');
@@ -156,6 +171,8 @@ function renderHistoryList(sessions) {
         optionsDiv.innerHTML = `
             <button onclick="renameSession('${session.id}')">Rename</button>
             <button onclick="downloadSession('${session.id}')">Download</button>
+            ${session.has_profile ? `<button onclick="downloadProfile('${session.id}')">Profile</button>` : ''}
+            ${session.resumable ? `<button onclick="resumeSession('${session.id}')">Resume</button>` : ''}
             <button onclick="deleteSession('${session.id}')">Delete</button>
         `;
         
@@ -207,6 +224,13 @@ async function loadSession(sessionId) {
     }
 }
 
+async function resumeSession(sessionId) {
+    await loadSession(sessionId);
+    backBtn.classList.add('hidden');
+    socket.emit('resume_session', { session_id: sessionId });
+    statusIndicator.textContent = 'Resuming';
+}
+
 async function renameSession(sessionId) {
     const newName = prompt("Enter new session name:");
     if (newName) {
@@ -228,4 +252,8 @@ async function deleteSession(sessionId) {
 
 function downloadSession(sessionId) {
     window.location.href = `/api/history/${sessionId}/download`;
+}
+
+function downloadProfile(sessionId) {
+    window.location.href = `/api/history/${sessionId}/profile`;
 }
\ No newline at end of file
@@ -0,0 +1,653 @@
+import ast
+import csv
+import hashlib
+import io
+import json
+import math
+import operator
+import os
+import sys
+import tempfile
+from collections import deque
+from doc_cache import CACHE_DIRNAME
+
+
+TABLE_EXTENSIONS = {'.csv', '.tsv', '.json', '.jsonl', '.ndjson'}
+OPERATIONS = ('schema', 'stats', 'head', 'tail', 'select', 'aggregate')
+AGGREGATES = ('count', 'sum', 'avg', 'min', 'max', 'distinct')
+READ_CHUNK = 1024 * 1024
+SCHEMA_SAMPLE_ROWS = 1000
+DISTINCT_CAP = 1000
+MAX_GROUPS = 10000
+MAX_CELL_CHARS = 200
+
+COMPARISONS = {
+    ast.Eq: operator.eq,
+    ast.NotEq: operator.ne,
+    ast.Lt: operator.lt,
+    ast.LtE: operator.le,
+    ast.Gt: operator.gt,
+    ast.GtE: operator.ge,
+    ast.In: lambda a, b: a in b,
+    ast.NotIn: lambda a, b: a not in b,
+}
+
+csv.field_size_limit(min(sys.maxsize, 2 ** 31 - 1))
+
+
+def coerce(value):
+
+    # CSV cells are strings; numbers are compared and aggregated as numbers, empty cells are nulls.
+    if not isinstance(value, str):
+        return value
+
+    if value == '':
+        return None
+
+    try:
+        return int(value)
+    except ValueError:
+        pass
+
+    try:
+        number = float(value)
+        return number if math.isfinite(number) else value
+    except ValueError:
+        return value
+
+
+def _iter_csv(path: str, delimiter: str):
+
+    with open(path, 'r', encoding='utf-8', errors='replace', newline='', buffering=READ_CHUNK) as f:
+        reader = csv.reader(f, delimiter=delimiter)
+        header = next(reader, None)
+
+        if header is None:
+            return
+
+        for row in reader:
+            if len(row) < len(header):
+                row = row + [''] * (len(header) - len(row))
+
+            yield {name: coerce(value) for name, value in zip(header, row)}
+
+
+def _iter_jsonl(path: str):
+
+    with open(path, 'r', encoding='utf-8', buffering=READ_CHUNK) as f:
+        for line_number, line in enumerate(f, start=1):
+            if not line.strip():
+                continue
+
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError as e:
+                raise ValueError(f'Invalid JSON on line {line_number}: {e}') from None
+
+            yield record if isinstance(record, dict) else {'value': record}
+
+
+def _iter_json_array(path: str):
+
+    # Decodes one array element at a time from fixed-size chunks, so the whole document is never in memory.
+    decoder = json.JSONDecoder()
+    buffer = ''
+    started = False
+
+    with open(path, 'r', encoding='utf-8') as f:
+        while True:
+            chunk = f.read(READ_CHUNK)
+            buffer += chunk
+            position = 0
+
+            while True:
+                while position < len(buffer) and buffer[position] in ' \t\r\n,':
+                    position += 1
+
+                if not started:
+                    if position >= len(buffer):
+                        break
+
+                    if buffer[position] != '[':
+                        raise ValueError('Expected a JSON array of objects (or a .jsonl file with one object per line).')
+
+                    started = True
+                    position += 1
+                    continue
+
+                if position < len(buffer) and buffer[position] == ']':
+                    return
+
+                try:
+                    record, end = decoder.raw_decode(buffer, position)
+                except json.JSONDecodeError:
+                    if not chunk:
+                        raise ValueError('Truncated or invalid JSON array.') from None
+                    break
+
+                yield record if isinstance(record, dict) else {'value': record}
+                position = end
+
+            buffer = buffer[position:]
+
+            if not chunk:
+                return
+
+
+def iter_records(path: str):
+
+    ext = os.path.splitext(path)[1].lower()
+
+    if ext == '.csv':
+        return _iter_csv(path, ',')
+
+    if ext == '.tsv':
+        return _iter_csv(path, '\t')
+
+    if ext in ('.jsonl', '.ndjson'):
+        return _iter_jsonl(path)
+
+    return _iter_json_array(path)
+
+
+def compile_filter(expression: str):
+
+    try:
+        tree = ast.parse(expression, mode='eval')
+    except SyntaxError as e:
+        raise ValueError(f'Invalid filter expression: {e.msg}') from None
+
+    def build(node):
+
+        if isinstance(node, ast.BoolOp):
+            parts = [build(value) for value in node.values]
+
+            if isinstance(node.op, ast.And):
+                return lambda row: all(part(row) for part in parts)
+
+            return lambda row: any(part(row) for part in parts)
+
+        if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.Not):
+            inner = build(node.operand)
+            return lambda row: not inner(row)
+
+        if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.USub):
+            inner = build(node.operand)
+            return lambda row: -inner(row)
+
+        if isinstance(node, ast.Compare):
+            left = build(node.left)
+            pairs = [(COMPARISONS[type(op)], build(comparator)) for op, comparator in zip(node.ops, node.comparators)
+                     if type(op) in COMPARISONS]
+
+            if len(pairs) != len(node.ops):
+                raise ValueError('Unsupported comparison operator in filter.')
+
+            def compare(row):
+
+                value = left(row)
+
+                for op, right in pairs:
+                    other = right(row)
+
+                    try:
+                        if not op(value, other):
+                            return False
+                    except TypeError:
+                        # Mixed types (e.g. a text cell in a numeric column) never match.
+                        return False
+
+                    value = other
+
+                return True
+
+            return compare
+
+        if isinstance(node, ast.Name):
+            if node.id in ('None', 'null'):
+                return lambda row: None
+            return lambda row, name=node.id: row.get(name)
+
+        if isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and node.func.id == 'col' \
+                and len(node.args) == 1 and isinstance(node.args[0], ast.Constant):
+            return lambda row, name=node.args[0].value: row.get(name)
+
+        if isinstance(node, ast.Constant):
+            return lambda row, value=node.value: value
+
+        if isinstance(node, (ast.List, ast.Tuple, ast.Set)):
+            items = [build(item) for item in node.elts]
+            return lambda row: [item(row) for item in items]
+
+        raise ValueError(f'Unsupported element in filter: {ast.dump(node)[:80]}')
+
+    return build(tree.body)
+
+
+def filter_columns(expression: str) -> set:
+
+    names = set()
+
+    for node in ast.walk(ast.parse(expression, mode='eval')):
+        if isinstance(node, ast.Name) and node.id not in ('None', 'null', 'col'):
+            names.add(node.id)
+        elif isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and node.func.id == 'col' \
+                and node.args and isinstance(node.args[0], ast.Constant):
+            names.add(node.args[0].value)
+
+    return names
+
+
+def _track_columns(records, names: set, present: set):
+
+    # A misspelt column would otherwise just match nothing; remember which referenced columns really occur.
+    for row in records:
+        if len(present) < len(names):
+            present.update(name for name in names if name in row)
+
+        yield row
+
+
+def _check_columns(names: set, present: set) -> None:
+
+    missing = sorted(names - present)
+
+    if missing:
+        raise ValueError(f'Unknown column(s): {", ".join(missing)}. Run the schema operation to list the columns.')
+
+
+def _split(names: str) -> list:
+
+    return [name.strip() for name in (names or '').split(',') if name.strip()]
+
+
+def parse_aggregations(aggregations: str) -> list:
+
+    parsed = []
+
+    for item in _split(aggregations) or ['count']:
+        function, _, column = item.partition(':')
+        function = function.strip().lower()
+
+        if function not in AGGREGATES:
+            raise ValueError(f'Unknown aggregation "{function}". Use one of {", ".join(AGGREGATES)} (e.g. "count, avg:price").')
+
+        if function != 'count' and not column.strip():
+            raise ValueError(f'Aggregation "{function}" needs a column, e.g. "{function}:price".')
+
+        parsed.append((function, column.strip()))
+
+    return parsed
+
+
+class _Accumulator:
+
+    def __init__(self, function: str):
+
+        self.function = function
+        self.count = 0
+        self.total = 0
+        self.value = None
+        self.distinct = set()
+
+    def add(self, value) -> None:
+
+        if self.function == 'count':
+            self.count += 1
+            return
+
+        if value is None:
+            return
+
+        if self.function in ('sum', 'avg'):
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                self.total += value
+                self.count += 1
+
+        elif self.function == 'min':
+            self.value = value if self.value is None or _less(value, self.value) else self.value
+
+        elif self.function == 'max':
+            self.value = value if self.value is None or _less(self.value, value) else self.value
+
+        elif len(self.distinct) <= DISTINCT_CAP:
+            self.distinct.add(_hashable(value))
+
+    def result(self):
+
+        if self.function == 'count':
+            return self.count
+
+        if self.function == 'sum':
+            return _round(self.total)
+
+        if self.function == 'avg':
+            return _round(self.total / self.count) if self.count else None
+
+        if self.function == 'distinct':
+            return f'>{DISTINCT_CAP}' if len(self.distinct) > DISTINCT_CAP else len(self.distinct)
+
+        return self.value
+
+
+def _less(a, b) -> bool:
+
+    try:
+        return a < b
+    except TypeError:
+        return str(a) < str(b)
+
+
+def _hashable(value):
+
+    return json.dumps(value, sort_keys=True, default=str) if isinstance(value, (dict, list)) else value
+
+
+def _round(value):
+
+    return round(value, 6) if isinstance(value, float) else value
+
+
+def _type_name(value) -> str:
+
+    if value is None:
+        return 'null'
+    if isinstance(value, bool):
+        return 'bool'
+    if isinstance(value, int):
+        return 'int'
+    if isinstance(value, float):
+        return 'float'
+    if isinstance(value, str):
+        return 'str'
+
+    return type(value).__name__
+
+
+def _render(rows: list, columns: list) -> str:
+
+    out = io.StringIO()
+    writer = csv.writer(out, lineterminator='\n')
+    writer.writerow(columns)
+
+    for row in rows:
+        cells = []
+
+        for column in columns:
+            value = row.get(column)
+            text = '' if value is None else (json.dumps(value, default=str) if isinstance(value, (dict, list)) else str(value))
+            cells.append(text if len(text) <= MAX_CELL_CHARS else text[:MAX_CELL_CHARS] + '...')
+
+        writer.writerow(cells)
+
+    return out.getvalue().rstrip('\n')
+
+
+def _columns_of(rows: list) -> list:
+
+    columns = []
+
+    for row in rows:
+        for name in row:
+            if name not in columns:
+                columns.append(name)
+
+    return columns
+
+
+def _project(columns: list, rows: list) -> list:
+
+    if columns:
+        missing = [name for name in columns if rows and all(name not in row for row in rows)]
+
+        if missing:
+            raise ValueError(f'Unknown column(s): {", ".join(missing)}. Available: {", ".join(_columns_of(rows))}')
+
+        return columns
+
+    return _columns_of(rows)
+
+
+def schema(path: str) -> str:
+
+    types = {}
+    sampled = 0
+
+    for row in iter_records(path):
+        for name, value in row.items():
+            types.setdefault(name, set()).add(_type_name(value))
+
+        sampled += 1
+
+        if sampled >= SCHEMA_SAMPLE_ROWS:
+            break
+
+    size = os.path.getsize(path)
+    lines = [f'{os.path.basename(path)}: {size / 1048576:.1f} MiB, {len(types)} columns (types from the first {sampled} rows)']
+
+    for name, seen in types.items():
+        non_null = sorted(seen - {'null'}) or ['null']
+        lines.append(f'  {name}: {"|".join(non_null)}{" (nullable)" if "null" in seen and non_null != ["null"] else ""}')
+
+    return '\n'.join(lines)
+
+
+def _stats_cache_path(path: str, cache_dir: str, logical_path: str) -> str:
+
+    stat = os.stat(path)
+    key = f'{logical_path or os.path.abspath(path)}\0{stat.st_size}\0{stat.st_mtime_ns}'
+    digest = hashlib.sha1(key.encode('utf-8', errors='replace')).hexdigest()
+    cache_dir = cache_dir or os.path.join(os.path.dirname(os.path.abspath(path)), CACHE_DIRNAME)
+
+    return os.path.join(cache_dir, 'stats', f'{digest}.json')
+
+
+def compute_stats(path: str) -> dict:
+
+    columns = {}
+    rows = 0
+
+    for row in iter_records(path):
+        rows += 1
+
+        for name, value in row.items():
+            column = columns.get(name)
+
+            if column is None:
+                column = columns[name] = {'nulls': rows - 1, 'count': 0, 'types': set(), 'n': 0, 'mean': 0.0, 'm2': 0.0,
+                                          'min': None, 'max': None, 'distinct': {}}
+
+            if value is None:
+                column['nulls'] += 1
+                continue
+
+            column['count'] += 1
+            column['types'].add(_type_name(value))
+
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                # Welford's running mean/variance keeps memory constant regardless of row count.
+                column['n'] += 1
+                delta = value - column['mean']
+                column['mean'] += delta / column['n']
+                column['m2'] += delta * (value - column['mean'])
+
+            if column['min'] is None or _less(value, column['min']):
+                column['min'] = value
+            if column['max'] is None or _less(column['max'], value):
+                column['max'] = value
+
+            distinct = column['distinct']
+
+            if distinct is not None:
+                key = _hashable(value)
+                distinct[key] = distinct.get(key, 0) + 1
+
+                if len(distinct) > DISTINCT_CAP:
+                    column['distinct'] = None
+
+        for name, column in columns.items():
+            if name not in row:
+                column['nulls'] += 1
+
+    summary = {'rows': rows, 'columns': {}}
+
+    for name, column in columns.items():
+        entry = {
+            'types': sorted(column['types']),
+            'non_null': column['count'],
+            'nulls': column['nulls'],
+            'min': column['min'] if not isinstance(column['min'], (dict, list)) else None,
+            'max': column['max'] if not isinstance(column['max'], (dict, list)) else None,
+        }
+
+        if column['n']:
+            entry['mean'] = _round(column['mean'])
+            entry['std'] = _round(math.sqrt(column['m2'] / column['n']))
+
+        if column['distinct'] is None:
+            entry['distinct'] = f'>{DISTINCT_CAP}'
+        else:
+            entry['distinct'] = len(column['distinct'])
+            top = sorted(column['distinct'].items(), key=lambda item: item[1], reverse=True)[:5]
+            entry['top'] = [[value, count] for value, count in top]
+
+        summary['columns'][name] = entry
+
+    return summary
+
+
+def stats(path: str, cache_dir: str = None, logical_path: str = None) -> dict:
+
+    # Keyed by size and mtime, so an edited file simply misses the cache instead of serving stale numbers.
+    cache_path = _stats_cache_path(path, cache_dir, logical_path)
+
+    try:
+        with open(cache_path, 'r') as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError):
+        pass
+
+    summary = compute_stats(path)
+
+    try:
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(cache_path), prefix='.tmp-')
+
+        with os.fdopen(fd, 'w') as f:
+            json.dump(summary, f, default=str)
+
+        os.replace(temp_path, cache_path)
+
+    except OSError:
+        # The cache is an optimisation; a read-only directory just means recomputing next time.
+        pass
+
+    return summary
+
+
+def format_stats(path: str, summary: dict, columns: list) -> str:
+
+    lines = [f'{os.path.basename(path)}: {summary["rows"]} rows, {len(summary["columns"])} columns']
+
+    for name, entry in summary['columns'].items():
+        if columns and name not in columns:
+            continue
+
+        parts = [f'types={"|".join(entry["types"]) or "null"}', f'non_null={entry["non_null"]}', f'nulls={entry["nulls"]}',
+                 f'distinct={entry["distinct"]}', f'min={entry["min"]}', f'max={entry["max"]}']
+
+        if 'mean' in entry:
+            parts.append(f'mean={entry["mean"]}')
+            parts.append(f'std={entry["std"]}')
+
+        if entry.get('top') and entry['distinct'] != summary['rows']:
+            parts.append('top=' + ', '.join(f'{value}({count})' for value, count in entry['top']))
+
+        lines.append(f'  {name}: ' + ' '.join(parts))
+
+    return '\n'.join(lines)
+
+
+def query(path: str, operation: str, columns: str = None, where: str = None, group_by: str = None,
+          aggregations: str = None, limit: int = 20, cache_dir: str = None, logical_path: str = None) -> str:
+
+    operation = (operation or '').strip().lower()
+
+    if operation not in OPERATIONS:
+        raise ValueError(f'Unknown operation "{operation}". Use one of {", ".join(OPERATIONS)}.')
+
+    limit = max(1, min(int(limit or 20), 1000))
+    selected = _split(columns)
+
+    if operation == 'schema':
+        return schema(path)
+
+    if operation == 'stats':
+        return format_stats(path, stats(path, cache_dir, logical_path), selected)
+
+    keys = _split(group_by)
+    parsed = parse_aggregations(aggregations) if operation == 'aggregate' else []
+    referenced = set(keys) | {column for _, column in parsed if column}
+    present = set()
+
+    if where:
+        predicate = compile_filter(where)
+        referenced |= filter_columns(where)
+
+    records = _track_columns(iter_records(path), referenced, present)
+
+    if where:
+        records = (row for row in records if predicate(row))
+
+    if operation == 'head' or operation == 'select':
+        rows = []
+        scanned_all = True
+
+        for row in records:
+            if len(rows) == limit:
+                scanned_all = False
+                break
+            rows.append(row)
+
+        if not rows:
+            _check_columns(referenced, present)
+
+        note = f'{len(rows)} row(s)' + ('' if scanned_all else f' (first {limit}; more rows match)')
+
+        return f'{note}\n{_render(rows, _project(selected, rows))}' if rows else 'No matching rows.'
+
+    if operation == 'tail':
+        rows = list(deque(records, maxlen=limit))
+        _check_columns(referenced, present)
+
+        return f'last {len(rows)} row(s)\n{_render(rows, _project(selected, rows))}' if rows else 'No matching rows.'
+
+    groups = {}
+
+    for row in records:
+        group = tuple(_hashable(row.get(key)) for key in keys)
+        accumulators = groups.get(group)
+
+        if accumulators is None:
+            if len(groups) >= MAX_GROUPS:
+                raise ValueError(f'More than {MAX_GROUPS} groups. Group by fewer or coarser columns, or add a filter.')
+
+            accumulators = groups[group] = [_Accumulator(function) for function, _ in parsed]
+
+        for accumulator, (function, column) in zip(accumulators, parsed):
+            accumulator.add(row.get(column) if column else None)
+
+    _check_columns(referenced, present)
+
+    headers = keys + [f'{function}({column})' if column else function for function, column in parsed]
+    result_rows = [dict(zip(headers, list(group) + [accumulator.result() for accumulator in accumulators]))
+                   for group, accumulators in groups.items()]
+
+    if keys:
+        # Largest groups first, so the truncated view shows what matters.
+        result_rows.sort(key=lambda row: row[headers[len(keys)]] if isinstance(row[headers[len(keys)]], (int, float)) else 0, reverse=True)
+
+    shown = result_rows[:limit]
+    note = f'{len(result_rows)} group(s)' + (f', showing {limit}' if len(result_rows) > limit else '')
+
+    return f'{note}\n{_render(shown, headers)}' if shown else 'No matching rows.'
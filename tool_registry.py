@@ -0,0 +1,116 @@
+import threading
+
+
+class ToolSpec:
+
+    def __init__(self, func, description: str, group: str):
+
+        self.func = func
+        self.name = func.__name__
+        self.description = description
+        self.group = group
+
+
+class ToolRegistry:
+
+    def __init__(self):
+
+        self.specs = {}
+        # Prompt sections: (names of the tools the section is about, text); an empty tuple means always included.
+        self.sections = []
+        self._tools = {}
+        self._messages = {}
+        self._lock = threading.Lock()
+
+    def register(self, func, description: str, group: str) -> None:
+
+        spec = ToolSpec(func, description, group)
+        self.specs[spec.name] = spec
+
+    def add_section(self, text: str, tools: tuple = ()) -> None:
+
+        self.sections.append((tuple(tools), text))
+
+    def resolve(self, enabled=None) -> tuple:
+
+        # Accepts tool names and group names; None enables everything, in registration order.
+        if enabled is None:
+            return tuple(self.specs)
+
+        wanted = set()
+
+        for item in enabled:
+            matches = [name for name, spec in self.specs.items() if item in (name, spec.group)]
+
+            if not matches:
+                raise ValueError(f'Unknown tool or tool group: {item!r}')
+
+            wanted.update(matches)
+
+        return tuple(name for name in self.specs if name in wanted)
+
+    def tool(self, name: str):
+
+        with self._lock:
+            tool = self._tools.get(name)
+
+            if tool is None:
+                from autogen.tools import Tool
+
+                spec = self.specs[name]
+                # Building a Tool introspects the Annotated signature into a JSON schema; done once per process.
+                tool = self._tools[name] = Tool(func_or_tool=spec.func, name=spec.name, description=spec.description)
+
+            return tool
+
+    def schemas(self, names: tuple) -> list:
+
+        return [self.tool(name).tool_schema for name in names]
+
+    def system_message(self, names: tuple) -> str:
+
+        key = frozenset(names)
+
+        with self._lock:
+            message = self._messages.get(key)
+
+            if message is None:
+                ordered = [name for name in self.specs if name in key]
+                lines = []
+
+                for tools, text in self.sections:
+                    if not tools or any(name in key for name in tools):
+                        # Plain replace rather than str.format: the sections contain literal JSON braces.
+                        lines.append(text.replace('{count}', str(len(ordered))).replace('{tools}', ', '.join(f'`{name}`' for name in ordered)))
+
+                message = self._messages[key] = '\n'.join(lines)
+
+            return message
+
+    def llm_config(self, llm_config, names: tuple):
+
+        # Passing every schema up front replaces one OpenAIWrapper rebuild per register_for_llm call.
+        config = llm_config.copy()
+        config['tools'] = self.schemas(names)
+
+        return config
+
+    def attach_executor(self, executor, names: tuple) -> None:
+
+        for name in names:
+            self.tool(name).register_for_execution(executor)
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_tool_registry() -> ToolRegistry:
+
+    global _registry
+
+    with _registry_lock:
+        if _registry is None:
+            _registry = ToolRegistry()
+
+        return _registry
@@ -1,4 +1,6 @@
+import os
 import sys
+import time
 import threading
 import queue
 import builtins
@@ -16,24 +18,44 @@ from flask import (
     request,
     send_file
 )
-from flask_socketio import SocketIO
+from flask_socketio import SocketIO, join_room
 from flask_sqlalchemy import SQLAlchemy
-from main import AgenticGemini
+from main import AgenticGemini, prewarm_imports
+from doc_cache import get_document_cache
+from profiling import RunProfiler, phase
+
+INPUT_POLL_SECONDS = 0.25
+
+def _database_url() -> str:
+
+    url = os.environ.get('DATABASE_URL', 'sqlite:///chat_history.db')
+
+    # Hosted PostgreSQL often hands out the postgres:// scheme, which SQLAlchemy no longer accepts.
+    if url.startswith('postgres://'):
+        url = 'postgresql://' + url[len('postgres://'):]
+
+    return url
 
 app = Flask(__name__)
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///chat_history.db'
+app.config['SQLALCHEMY_DATABASE_URI'] = _database_url()
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {'pool_pre_ping': True}
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+# When set, sessions are queued as jobs for session_worker.py processes instead of running in this process.
+app.config['EXTERNAL_WORKERS'] = False
 
 db = SQLAlchemy(app)
 socketio = SocketIO(
     app,
     cors_allowed_origins='*',
-    async_mode='threading'
+    async_mode='threading',
+    message_queue=os.environ.get('SOCKETIO_MESSAGE_QUEUE')
 )
 
-input_queue = queue.Queue()
+input_queues = {}
+input_queues_lock = threading.Lock()
 output_lock = threading.Lock()
-current_session_id = None
+# Without external workers every session shares this process's stdout, input() and web_io, so only one runs at a time.
+in_process_slot = threading.Lock()
 
 class ChatSession(db.Model):
 
@@ -54,12 +76,95 @@ class ChatMessage(db.Model):
     content = db.Column(db.Text, nullable=False)
     timestamp = db.Column(db.DateTime, default=datetime.utcnow)
 
+class SessionProfile(db.Model):
+
+    id = db.Column(db.Integer, primary_key=True)
+    session_id = db.Column(
+        db.String(36),
+        db.ForeignKey('chat_session.id'),
+        nullable=False
+    )
+    report = db.Column(db.Text, nullable=False)
+    stats = db.Column(db.LargeBinary)
+    timestamp = db.Column(db.DateTime, default=datetime.utcnow)
+
+class SessionCheckpoint(db.Model):
+
+    session_id = db.Column(
+        db.String(36),
+        db.ForeignKey('chat_session.id'),
+        primary_key=True
+    )
+    mode = db.Column(db.String(50))
+    state = db.Column(db.Text, nullable=False)
+    # running -> finished, or interrupted if the process died (or the mode failed) before the end.
+    status = db.Column(db.String(20), nullable=False, default='running')
+    updated = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class SessionJob(db.Model):
+
+    id = db.Column(db.Integer, primary_key=True)
+    session_id = db.Column(
+        db.String(36),
+        db.ForeignKey('chat_session.id'),
+        nullable=False
+    )
+    mode = db.Column(db.String(50), nullable=False)
+    profile = db.Column(db.Boolean, default=False)
+    resume_state = db.Column(db.Text)
+    # queued -> claimed -> done, or failed if the worker stopped sending heartbeats.
+    status = db.Column(db.String(20), nullable=False, default='queued', index=True)
+    worker = db.Column(db.String(100))
+    heartbeat = db.Column(db.DateTime)
+    timestamp = db.Column(db.DateTime, default=datetime.utcnow)
+
+class SessionInput(db.Model):
+
+    id = db.Column(db.Integer, primary_key=True)
+    session_id = db.Column(
+        db.String(36),
+        db.ForeignKey('chat_session.id'),
+        nullable=False,
+        index=True
+    )
+    content = db.Column(db.Text, nullable=False)
+    consumed = db.Column(db.Boolean, nullable=False, default=False)
+    timestamp = db.Column(db.DateTime, default=datetime.utcnow)
+
+def _input_queue(session_id: str) -> queue.Queue:
+
+    with input_queues_lock:
+        return input_queues.setdefault(session_id, queue.Queue())
+
+def _queued_input(session_id: str) -> str:
+
+    return _input_queue(session_id).get()
+
+def _stored_input(session_id: str) -> str:
+
+    # A worker process does not share memory with the web process that received the reply, so it arrives via the database.
+    while True:
+        with app.app_context():
+            entry = SessionInput.query.filter_by(
+                session_id=session_id,
+                consumed=False
+            ).order_by(SessionInput.id).first()
+
+            if entry is not None:
+                entry.consumed = True
+                db.session.commit()
+                return entry.content
+
+        time.sleep(INPUT_POLL_SECONDS)
+
 class WebIO:
 
-    def __init__(self):
+    def __init__(self, input_source=_queued_input):
 
         self.original_stdout = sys.stdout
         self.original_input = builtins.input
+        self.input_source = input_source
+        self.session_id = None
         self.suppress_patterns = [
             r'Max turns: \d+',
             r'Using default .*',
@@ -96,7 +201,8 @@ class WebIO:
 
         with output_lock:
             if text and not self._should_filter(text):
-                socketio.emit('server_output', {'data': text})
+                with phase('socket_emit'):
+                    socketio.emit('server_output', {'data': text}, to=self.session_id)
                 self._save_to_db('agent', text)
 
     def flush(self) -> None:
@@ -106,9 +212,12 @@ class WebIO:
     def input(self, prompt: str = '') -> str:
 
         with output_lock:
-            socketio.emit('request_input', {'prompt': prompt})
+            socketio.emit('request_input', {'prompt': prompt}, to=self.session_id)
+
+        with phase('awaiting_input'):
+            reply = self.input_source(self.session_id)
 
-        return input_queue.get()
+        return reply
 
     def start_intercept(self) -> None:
 
@@ -120,12 +229,14 @@ class WebIO:
         sys.stdout = self.original_stdout
         builtins.input = self.original_input
 
-    def _save_to_db(self, sender: str, content: str) -> None:
+    def _save_to_db(self, sender: str, content: str, session_id: str = None) -> None:
 
-        if current_session_id:
-            with app.app_context():
+        session_id = session_id or self.session_id
+
+        if session_id:
+            with phase('db_write'), app.app_context():
                 msg = ChatMessage(
-                    session_id=current_session_id,
+                    session_id=session_id,
                     sender=sender,
                     content=content
                 )
@@ -134,6 +245,27 @@ class WebIO:
 
 web_io = WebIO()
 
+def _save_checkpoint(session_id: str, state: dict) -> None:
+
+    with phase('db_write'), app.app_context():
+        checkpoint = SessionCheckpoint.query.get(session_id)
+
+        if checkpoint is None:
+            checkpoint = SessionCheckpoint(session_id=session_id, mode=ChatSession.query.get(session_id).mode)
+            db.session.add(checkpoint)
+
+        checkpoint.state = json.dumps(state)
+        checkpoint.status = 'running'
+        db.session.commit()
+
+def _set_checkpoint_status(session_id: str, status: str) -> None:
+
+    with app.app_context():
+        SessionCheckpoint.query.filter_by(session_id=session_id).update({'status': status})
+        db.session.commit()
+
+AgenticGemini.checkpoint_handler = _save_checkpoint
+
 @app.route('/')
 def index() -> str:
 
@@ -143,11 +275,15 @@ def index() -> str:
 def get_history() -> Any:
 
     sessions = ChatSession.query.order_by(ChatSession.timestamp.desc()).all()
+    profiled_ids = {p.session_id for p in SessionProfile.query.with_entities(SessionProfile.session_id)}
+    resumable_ids = {c.session_id for c in SessionCheckpoint.query.filter_by(status='interrupted').with_entities(SessionCheckpoint.session_id)}
     return jsonify([{
         'id': s.id,
         'name': s.name or f'Session {s.timestamp.strftime("%Y-%m-%d %H:%M")}',
         'timestamp': s.timestamp.isoformat(),
-        'mode': s.mode
+        'mode': s.mode,
+        'has_profile': s.id in profiled_ids,
+        'resumable': s.id in resumable_ids
     } for s in sessions])
 
 @app.route('/api/history/<session_id>')
@@ -166,6 +302,10 @@ def get_session_messages(session_id: str) -> Any:
 def delete_session(session_id: str) -> Any:
 
     ChatMessage.query.filter_by(session_id=session_id).delete()
+    SessionProfile.query.filter_by(session_id=session_id).delete()
+    SessionCheckpoint.query.filter_by(session_id=session_id).delete()
+    SessionJob.query.filter_by(session_id=session_id).delete()
+    SessionInput.query.filter_by(session_id=session_id).delete()
     ChatSession.query.filter_by(id=session_id).delete()
     db.session.commit()
     return jsonify({'status': 'success'})
@@ -207,37 +347,156 @@ def download_session(session_id: str) -> Any:
         mimetype='text/plain'
     )
 
+@app.route('/api/history/<session_id>/profile')
+def download_profile(session_id: str) -> Any:
+
+    session_entry = ChatSession.query.get(session_id)
+    profile_entry = SessionProfile.query.filter_by(
+        session_id=session_id
+    ).order_by(SessionProfile.timestamp.desc()).first()
+
+    if not session_entry or not profile_entry:
+        return jsonify({'status': 'error'}), 404
+
+    if request.args.get('format') == 'pstats':
+        return send_file(
+            io.BytesIO(profile_entry.stats or b''),
+            as_attachment=True,
+            download_name=f'{session_entry.name or "session"}.prof',
+            mimetype='application/octet-stream'
+        )
+
+    return send_file(
+        io.BytesIO(profile_entry.report.encode('utf-8')),
+        as_attachment=True,
+        download_name=f'{session_entry.name or "session"}-profile.txt',
+        mimetype='text/plain'
+    )
+
+@socketio.on('join_session')
+def handle_join_session(data: dict) -> None:
+
+    # After a reconnect (possibly to another web process) the browser rejoins its session's room.
+    if data.get('session_id'):
+        join_room(data['session_id'])
+
 @socketio.on('user_input')
 def handle_user_input(data: dict) -> None:
 
+    session_id = data.get('session_id')
     user_text = data.get('message', '')
-    web_io._save_to_db('user', user_text)
-    input_queue.put(user_text)
+    web_io._save_to_db('user', user_text, session_id)
+
+    if app.config['EXTERNAL_WORKERS']:
+        with app.app_context():
+            db.session.add(SessionInput(session_id=session_id, content=user_text))
+            db.session.commit()
+    else:
+        _input_queue(session_id).put(user_text)
 
 @socketio.on('start_mode')
 def handle_start_mode(data: dict) -> None:
 
-    global current_session_id
     mode = data.get('mode')
-    current_session_id = str(uuid.uuid4())
+    profile = bool(data.get('profile'))
+    session_id = str(uuid.uuid4())
 
-    with app.app_context():
-        session_entry = ChatSession(
-            id=current_session_id,
-            mode=mode,
-            name=f'Mode {mode} - {datetime.now().strftime("%H:%M")}'
-        )
-        db.session.add(session_entry)
-        db.session.commit()
+    if not _claim_session_slot():
+        return
+
+    try:
+        with app.app_context():
+            session_entry = ChatSession(
+                id=session_id,
+                mode=mode,
+                name=f'Mode {mode} - {datetime.now().strftime("%H:%M")}'
+            )
+            db.session.add(session_entry)
+            db.session.commit()
+
+        join_room(session_id)
+        socketio.emit('session_started', {'session_id': session_id}, to=request.sid)
+        _dispatch_session(session_id, mode, profile)
+    except Exception:
+        _release_session_slot()
+        raise
+
+@socketio.on('resume_session')
+def handle_resume_session(data: dict) -> None:
+
+    session_id = data.get('session_id')
+
+    if not _claim_session_slot():
+        return
+
+    try:
+        with app.app_context():
+            checkpoint = SessionCheckpoint.query.get(session_id)
+
+            if checkpoint is None or checkpoint.status != 'interrupted':
+                socketio.emit('server_output', {'data': 'Error: This session has no checkpoint to resume from.'}, to=request.sid)
+                socketio.emit('session_ended', to=request.sid)
+                _release_session_slot()
+                return
 
-    thread = threading.Thread(target=run_agent_mode, args=(mode,))
+            mode = checkpoint.mode
+            state = json.loads(checkpoint.state)
+            checkpoint.status = 'running'
+            db.session.commit()
+
+        join_room(session_id)
+        socketio.emit('session_started', {'session_id': session_id}, to=request.sid)
+        _dispatch_session(session_id, mode, False, state)
+    except Exception:
+        _release_session_slot()
+        raise
+
+def _claim_session_slot() -> bool:
+
+    if app.config['EXTERNAL_WORKERS'] or in_process_slot.acquire(blocking=False):
+        return True
+
+    socketio.emit('server_output', {'data': 'Error: Another session is already running on this server. Wait for it to finish, or start the server with --external-workers to run sessions in parallel.'}, to=request.sid)
+    socketio.emit('session_ended', to=request.sid)
+
+    return False
+
+def _release_session_slot() -> None:
+
+    if not app.config['EXTERNAL_WORKERS']:
+        in_process_slot.release()
+
+def _run_in_process(session_id: str, mode: str, profile: bool, resume_state: dict = None) -> None:
+
+    try:
+        run_agent_mode(session_id, mode, profile, resume_state)
+    finally:
+        _release_session_slot()
+
+def _dispatch_session(session_id: str, mode: str, profile: bool, resume_state: dict = None) -> None:
+
+    if app.config['EXTERNAL_WORKERS']:
+        with app.app_context():
+            db.session.add(SessionJob(
+                session_id=session_id,
+                mode=mode,
+                profile=profile,
+                resume_state=json.dumps(resume_state) if resume_state else None
+            ))
+            db.session.commit()
+        return
+
+    thread = threading.Thread(target=_run_in_process, args=(session_id, mode, profile, resume_state))
     thread.daemon = True
     thread.start()
 
-def run_agent_mode(mode_id: str) -> None:
+def run_agent_mode(session_id: str, mode_id: str, profile: bool = False, resume_state: dict = None) -> None:
 
     config_path = 'config_path.json'
     max_calls = 10
+    profiler = None
+    web_io.session_id = session_id
+    status = 'interrupted'
 
     logging.getLogger('werkzeug').setLevel(logging.ERROR)
     logging.getLogger('httpx').setLevel(logging.WARNING)
@@ -246,13 +505,34 @@ def run_agent_mode(mode_id: str) -> None:
     logging.getLogger('urllib3').setLevel(logging.WARNING)
 
     try:
+        if profile:
+            profiler = RunProfiler(f'Mode {mode_id} - {session_id}')
+
+            try:
+                profiler.start()
+            except RuntimeError as e:
+                print(f'Profiling disabled for this run: {str(e)}')
+                profiler = None
+
         with open(config_path, 'r') as f:
             app_config = json.load(f)
 
         config_list_path = app_config['config_path']
         gemini = AgenticGemini(
             config_path=config_list_path,
-            max_calls=max_calls
+            max_calls=max_calls,
+            session_id=session_id,
+            approval_policy_path=app_config.get('approval_policy_path'),
+            history_token_budget=app_config.get('history_token_budget', 6000),
+            speaker_selection=app_config.get('speaker_selection', 'auto'),
+            max_parallel_workers=app_config.get('max_parallel_workers', 4),
+            max_subtasks=app_config.get('max_subtasks', 8),
+            session_workspaces=app_config.get('session_workspaces', False),
+            workspace_on_exit=app_config.get('workspace_on_exit', 'ask'),
+            model_client=app_config.get('model_client'),
+            enabled_tools=app_config.get('enabled_tools'),
+            resume_state=resume_state,
+            progress_handler=lambda message: socketio.emit('tool_progress', {'data': message}, to=session_id),
         )
 
         web_io.start_intercept()
@@ -277,17 +557,62 @@ def run_agent_mode(mode_id: str) -> None:
         elif mode_id == '5':
             gemini.run_tool_use_chat()
 
+        elif mode_id == '6':
+            gemini.run_parallel_fanout_chat()
+
+        status = 'finished'
+
     except Exception as e:
         print(f'Error: {str(e)}')
 
     finally:
         web_io.stop_intercept()
-        socketio.emit('session_ended')
+        # A failed run (e.g. quota exhausted) stays resumable, just like one cut short by a restart.
+        _set_checkpoint_status(session_id, status)
+
+        if profiler:
+            profiler.stop()
+            _save_profile(session_id, profiler)
+
+        socketio.emit('session_ended', to=session_id)
+        web_io.session_id = None
+
+        with input_queues_lock:
+            input_queues.pop(session_id, None)
+
+def _save_profile(session_id: str, profiler: RunProfiler) -> None:
+
+    with app.app_context():
+        db.session.add(SessionProfile(
+            session_id=session_id,
+            report=profiler.report(),
+            stats=profiler.stats_bytes()
+        ))
+        db.session.commit()
 
 if __name__ == '__main__':
+    app.config['EXTERNAL_WORKERS'] = '--external-workers' in sys.argv
+
+    if app.config['EXTERNAL_WORKERS'] and not os.environ.get('SOCKETIO_MESSAGE_QUEUE'):
+        sys.exit('--external-workers needs SOCKETIO_MESSAGE_QUEUE (e.g. redis://localhost:6379/0) so workers can reach the browser.')
+
     with app.app_context():
         db.create_all()
 
+        # With external workers a web restart interrupts nothing; stale worker jobs are reaped by the workers.
+        if not app.config['EXTERNAL_WORKERS']:
+            # Whatever was still running when the previous process stopped can be resumed from its last checkpoint.
+            SessionCheckpoint.query.filter_by(status='running').update({'status': 'interrupted'})
+            db.session.commit()
+
+    if '--prewarm' in sys.argv:
+        # Load the agent stack in the background so the first mode does not pay for it, without delaying startup.
+        threading.Thread(target=prewarm_imports, daemon=True).start()
+
+    if '--convert-documents' in sys.argv:
+        # Convert PDFs, DOCX files and notebooks to sidecars ahead of time so first reads are seeks, not parses.
+        get_document_cache().start_background()
+
     socketio.run(
         app,
         host='0.0.0.0',
@@ -0,0 +1,301 @@
+import errno
+import json
+import logging
+import os
+import shutil
+import threading
+import fast_copy
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+
+BASE_DIR = '/my_files'
+WORKSPACES_DIRNAME = '.agentic_workspaces'
+
+
+def _is_internal(name: str) -> bool:
+
+    return name.startswith('.agentic_')
+
+
+class Workspace:
+
+    def __init__(self, session_id: str, base_dir: str = BASE_DIR, root: str = None):
+
+        self.session_id = session_id
+        self.base_dir = os.path.normpath(base_dir)
+        self.root = os.path.normpath(root or os.path.join(self.base_dir, WORKSPACES_DIRNAME))
+        self.path = os.path.join(self.root, session_id)
+        self.manifest_path = self.path + '.manifest.json'
+        self.logger = logging.getLogger(__name__)
+        self.link_counts = {'reflink': 0, 'copy': 0}
+        self._reflink_supported = fcntl is not None
+        # Base-tree snapshot taken at creation: relative path -> (inode, size, mtime_ns), None for directories.
+        self._manifest = {}
+
+    def create(self) -> 'Workspace':
+
+        if os.path.exists(self.path):
+            shutil.rmtree(self.path)
+
+        os.makedirs(self.path)
+
+        if not self._reflink_supported:
+            self._warn_full_copy()
+
+        for root, dirs, files in os.walk(self.base_dir):
+            dirs[:] = [d for d in dirs if not _is_internal(d)]
+            relative_root = os.path.relpath(root, self.base_dir)
+            target_root = os.path.normpath(os.path.join(self.path, relative_root))
+
+            for d in dirs:
+                os.makedirs(os.path.join(target_root, d), exist_ok=True)
+                self._manifest[os.path.normpath(os.path.join(relative_root, d))] = None
+
+            for name in files:
+                source = os.path.join(root, name)
+                st = os.lstat(source)
+                self._link(source, os.path.join(target_root, name))
+                self._manifest[os.path.normpath(os.path.join(relative_root, name))] = (st.st_ino, st.st_size, st.st_mtime_ns)
+
+        # Kept on disk so a session resumed by a restarted process can still tell its own changes apart.
+        with open(self.manifest_path, 'w') as f:
+            json.dump(self._manifest, f)
+
+        self.logger.info('Workspace %s ready (%s)', self.path, self.link_counts)
+
+        return self
+
+    def restore(self) -> 'Workspace':
+
+        if not os.path.isdir(self.path):
+            return self.create()
+
+        try:
+            with open(self.manifest_path, 'r') as f:
+                self._manifest = {path: tuple(entry) if entry else None for path, entry in json.load(f).items()}
+        except (OSError, ValueError):
+            return self.create()
+
+        self.logger.info('Workspace %s restored', self.path)
+
+        return self
+
+    def _link(self, source: str, target: str) -> None:
+
+        if os.path.islink(source):
+            os.symlink(os.readlink(source), target)
+            return
+
+        # A reflink is real copy-on-write, so even in-place writes from executed code stay private.
+        if self._reflink_supported:
+            try:
+                with open(source, 'rb') as src, open(target, 'wb') as dst:
+                    fcntl.ioctl(dst.fileno(), fast_copy.FICLONE, src.fileno())
+                shutil.copystat(source, target)
+                self.link_counts['reflink'] += 1
+                return
+            except OSError:
+                os.remove(target)
+                # One failure means the filesystem cannot clone; stop paying for the attempt on every file.
+                self._reflink_supported = False
+                self._warn_full_copy()
+
+        # A full copy, never a hard link (executed code could write the shared inode in place). The workspace
+        # directory was just created, so there are no partial copies to look for.
+        fast_copy.copy_file(source, target, fast_copy.CopyProgress(1, 0), partials=[])
+        self.link_counts['copy'] += 1
+
+    def _warn_full_copy(self) -> None:
+
+        self.logger.warning('Workspace %s: %s has no reflink support, so every file is copied in full', self.path, self.base_dir)
+
+    def contains(self, absolute_path: str) -> bool:
+
+        return absolute_path == self.path or absolute_path.startswith(self.path + os.sep)
+
+    def logical_path(self, absolute_path: str) -> str:
+
+        if not self.contains(absolute_path):
+            return absolute_path
+
+        return os.path.normpath(os.path.join(self.base_dir, os.path.relpath(absolute_path, self.path)))
+
+    def _is_modified(self, relative_path: str, st) -> bool:
+
+        snapshot = self._manifest.get(relative_path)
+
+        if snapshot is None:
+            return True
+
+        inode, size, mtime_ns = snapshot
+
+        # The inode says nothing here: an in-place write keeps a hard link's inode, and a reflink or copy never had it.
+        return (st.st_size, st.st_mtime_ns) != (size, mtime_ns)
+
+    def _base_changed(self, relative_path: str) -> bool:
+
+        target = os.path.join(self.base_dir, relative_path)
+        exists = os.path.lexists(target)
+
+        if relative_path not in self._manifest:
+            return exists
+
+        snapshot = self._manifest[relative_path]
+
+        if not exists:
+            return True
+
+        if snapshot is None:
+            return False
+
+        st = os.lstat(target)
+
+        return (st.st_ino, st.st_size, st.st_mtime_ns) != snapshot
+
+    def changes(self) -> dict:
+
+        added, modified, deleted = [], [], []
+        seen = set()
+
+        for root, dirs, files in os.walk(self.path):
+            dirs[:] = [d for d in dirs if not _is_internal(d)]
+            relative_root = os.path.relpath(root, self.path)
+
+            for name in dirs + files:
+                relative_path = os.path.normpath(os.path.join(relative_root, name))
+                seen.add(relative_path)
+                absolute_path = os.path.join(root, name)
+
+                if relative_path not in self._manifest:
+                    added.append(relative_path)
+                elif name in files and self._is_modified(relative_path, os.lstat(absolute_path)):
+                    modified.append(relative_path)
+
+        deleted = sorted(path for path in self._manifest if path not in seen)
+
+        return {'added': sorted(added), 'modified': sorted(modified), 'deleted': deleted}
+
+    def commit(self) -> dict:
+
+        changes = self.changes()
+        conflicts = []
+
+        for relative_path in changes['added'] + changes['modified']:
+            source = os.path.join(self.path, relative_path)
+            target = os.path.join(self.base_dir, relative_path)
+
+            if os.path.isdir(source) and not os.path.islink(source):
+                os.makedirs(target, exist_ok=True)
+                continue
+
+            # Someone else changed the same file in the base tree since this workspace was created.
+            if self._base_changed(relative_path) and os.path.lexists(target):
+                conflicts.append(relative_path)
+                continue
+
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            # Same filesystem: renaming the private copy into place is atomic and copies nothing.
+            try:
+                os.replace(source, target)
+            except OSError as e:
+                if e.errno != errno.EXDEV:
+                    raise
+                fast_copy.copy_file(source, target, fast_copy.CopyProgress(1, 0))
+
+        # Children before parents so directories are empty by the time they are removed.
+        for relative_path in sorted(changes['deleted'], key=len, reverse=True):
+            target = os.path.join(self.base_dir, relative_path)
+
+            if not os.path.lexists(target):
+                continue
+
+            if self._base_changed(relative_path):
+                conflicts.append(relative_path)
+                continue
+
+            if os.path.isdir(target) and not os.path.islink(target):
+                try:
+                    os.rmdir(target)
+                except OSError:
+                    conflicts.append(relative_path)
+            else:
+                os.remove(target)
+
+        self.discard()
+        changes['conflicts'] = sorted(set(conflicts))
+
+        return changes
+
+    def discard(self) -> None:
+
+        shutil.rmtree(self.path, ignore_errors=True)
+
+        if os.path.exists(self.manifest_path):
+            os.remove(self.manifest_path)
+
+        try:
+            os.rmdir(self.root)
+        except OSError:
+            pass
+
+
+class WorkspaceManager:
+
+    def __init__(self, base_dir: str = BASE_DIR, root: str = None):
+
+        self.base_dir = base_dir
+        self.root = root
+        self._workspaces = {}
+        self._lock = threading.Lock()
+
+    def open(self, session_id: str, resume: bool = False) -> Workspace:
+
+        with self._lock:
+            workspace = self._workspaces.get(session_id)
+
+            if workspace is None:
+                workspace = Workspace(session_id, self.base_dir, self.root)
+                workspace = workspace.restore() if resume else workspace.create()
+                self._workspaces[session_id] = workspace
+
+            return workspace
+
+    def get(self, session_id: str):
+
+        with self._lock:
+            return self._workspaces.get(session_id)
+
+    def close(self, session_id: str, commit: bool) -> dict:
+
+        with self._lock:
+            workspace = self._workspaces.pop(session_id, None)
+
+        if workspace is None:
+            return {}
+
+        if commit:
+            return workspace.commit()
+
+        changes = workspace.changes()
+        workspace.discard()
+
+        return changes
+
+
+_manager = None
+_manager_lock = threading.Lock()
+
+
+def get_workspace_manager(**kwargs) -> WorkspaceManager:
+
+    global _manager
+
+    with _manager_lock:
+        if _manager is None:
+            _manager = WorkspaceManager(**kwargs)
+
+        return _manager